@@ -1,50 +1,68 @@
 import altair as alt
 import streamlit as st
 import pandas as pd
-import re
 import json
-import concurrent.futures
+import hashlib
 import time
 from openai import OpenAI
+from llm_scheduler import LLMScheduler, DEFAULT_MAX_OUTPUT_TOKENS
+import keyword_index
+import jobs
+import sampling
+import insight_store
+import topics
 
 # =======================================================
 # 🔧 配置区域
 # =======================================================
-DEEPSEEK_API_KEY = st.secrets.get("DEEPSEEK_API_KEY", "")
+def _secret(name, default=""):
+    # 未配置 .streamlit/secrets.toml 时 st.secrets 会抛出 (FileNotFoundError 子类)，按未配置处理
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
+
+DEEPSEEK_API_KEY = _secret("DEEPSEEK_API_KEY")
 BASE_URL = "https://api.deepseek.com"
 
+# Map 切片参数：每种情感最多 MAX_CHUNKS_PER_TYPE 个 CHUNK_SIZE 字的切片
+CHUNK_SIZE = 3000
+MAX_CHUNKS_PER_TYPE = 4
+# 有主题聚类摘要兜底覆盖面时，Map 阶段只需更少的原文切片
+MAX_CHUNKS_WITH_TOPICS = 2
+
+# 单次分析的 Token 预算按默认切片方案估算 (好评 + 差评)：
+# Map 每个满切片 = 正文 (中文约 1 字 1 Token) + 输出上限；Reduce = 全部 Map 摘要 + 上次结论/主题摘要/提示词 + 输出上限
+MAP_CHUNK_TOKENS = CHUNK_SIZE + 1 + DEFAULT_MAX_OUTPUT_TOKENS
+REDUCE_CONTEXT_TOKENS = 2000
+REDUCE_TOKENS = MAX_CHUNKS_PER_TYPE * DEFAULT_MAX_OUTPUT_TOKENS + REDUCE_CONTEXT_TOKENS + DEFAULT_MAX_OUTPUT_TOKENS
+ANALYSIS_TOKEN_BUDGET = 2 * (MAX_CHUNKS_PER_TYPE * MAP_CHUNK_TOKENS + REDUCE_TOKENS)
+
+# 全局调度器：跨会话共享 API 延迟/错误率统计
+LLM_SCHEDULER = LLMScheduler(token_budget=ANALYSIS_TOKEN_BUDGET)
+
 # =======================================================
 # 1. 本地规则引擎 (Fallback)
 # =======================================================
-LOCAL_FALLBACK_DB = {
-    "通用": {
-        "positive": {
-            "画面表现": {"kws": ["画面", "画质", "风景", "光影", "美术"], "desc": "视觉效果出色，美术风格符合大众审美。"},
-            "游戏性": {"kws": ["好玩", "上头", "有趣", "机制", "玩法"], "desc": "核心玩法设计有趣，具有较高的可玩性。"},
-            "剧情叙事": {"kws": ["剧情", "故事", "结局", "人设", "角色"], "desc": "叙事完整，角色塑造较为成功。"}
-        },
-        "negative": {
-            "优化问题": {"kws": ["掉帧", "卡顿", "闪退", "优化"], "desc": "存在明显的性能问题，影响流畅度。"},
-            "Bug故障": {"kws": ["bug", "BUG", "报错", "坏档"], "desc": "技术故障较多，急需修复。"},
-            "网络联机": {"kws": ["掉线", "连不上", "服务器", "延迟"], "desc": "网络体验不佳，联机稳定性差。"}
-        }
-    }
-}
+# 分类词典已外置到 dictionaries/ (按 app_id 配置，支持热加载)，
+# 由 keyword_index 编译为与清洗打分共享的索引，见 get_fallback_result
 
 # =======================================================
 # 2. LLM 核心逻辑 (细粒度并发 Map-Reduce)
 # =======================================================
 
-def get_llm_client():
-    return OpenAI(api_key=DEEPSEEK_API_KEY, base_url=BASE_URL)
+def get_llm_client(timeout=None):
+    if timeout is None:
+        return OpenAI(api_key=DEEPSEEK_API_KEY, base_url=BASE_URL)
+    # 由调度器控制超时：不做 SDK 内部重试，失败的切片直接降级
+    return OpenAI(api_key=DEEPSEEK_API_KEY, base_url=BASE_URL, timeout=timeout, max_retries=0)
 
-def map_phase_worker(args):
+def map_phase_worker(text_chunk, game_name, sentiment_type, app_id=None):
     """ 
-    Map 阶段 Worker：只负责分析一个小切片 
-    返回: (sentiment_type, summary_text)
+    Map 阶段 Worker：只负责分析一个小切片 (调度器以 worker(*args) 调用)
+    返回: (sentiment_type, summary_text)，异常交由调度器统计并降级
     """
-    text_chunk, game_name, sentiment_type = args
-    client = get_llm_client()
+    client = get_llm_client(timeout=LLM_SCHEDULER.request_timeout)
     target_type = "优点/爽点" if sentiment_type == "positive" else "缺点/槽点"
     
     prompt = f"""
@@ -54,19 +72,28 @@ def map_phase_worker(args):
     评论片段：
     {text_chunk}
     """
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-        return (sentiment_type, response.choices[0].message.content)
-    except Exception:
-        return (sentiment_type, "")
+    response = client.chat.completions.create(
+        model="deepseek-chat",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=LLM_SCHEDULER.max_output_tokens
+    )
+    return (sentiment_type, response.choices[0].message.content)
 
-def reduce_phase_worker(combined_summaries, game_name, sentiment_type):
-    """ Reduce 阶段 Worker：负责汇总 """
-    client = get_llm_client()
+def map_phase_fallback(args):
+    """ Map 阶段本地降级：用规则引擎为单个切片生成摘要 """
+    text_chunk, _, sentiment_type, app_id = args
+    top, _ = get_fallback_result(pd.Series([text_chunk]), sentiment_type, app_id)
+    summary = "；".join(f"{item['category']}（提及 {item['score']} 次）：{item['desc']}" for item in top)
+    return (sentiment_type, summary)
+
+def reduce_phase_worker(combined_summaries, game_name, sentiment_type, previous=None, digest=None):
+    """
+    Reduce 阶段 Worker：负责汇总
+    previous: 上一次的汇总结论，存在时做增量合并
+    digest: 全量评论的主题聚类摘要 (topics.cluster_digest)，代替原文提供覆盖面
+    """
+    client = get_llm_client(timeout=LLM_SCHEDULER.request_timeout)
     target_type = "优点/爽点" if sentiment_type == "positive" else "缺点/槽点"
     is_negative = "缺点" in target_type or "槽点" in target_type
     
@@ -76,6 +103,7 @@ def reduce_phase_worker(combined_summaries, game_name, sentiment_type):
     你是一位资深游戏主编。任务是分析《{game_name}》的【{target_type}】报告。
     请遵循：1.去重聚合 2.思维链推理 3.格式化输出
     {entity_instruction}
+    {"5. 【增量合并】：用户会同时提供此前的汇总结论与新增评论的摘要。请保留仍然成立的结论，按新证据调整 score，补充新出现的要点。" if previous else ""}
     
     【重要】必须严格输出为以下 JSON 格式对象：
     {{
@@ -86,12 +114,17 @@ def reduce_phase_worker(combined_summaries, game_name, sentiment_type):
         "entities": ["名称1", "名称2"] 
     }}
     """
+    user_content = f"汇总摘要：\n{combined_summaries}"
+    if previous:
+        user_content = f"此前的汇总结论：\n{json.dumps(previous, ensure_ascii=False)}\n\n新增评论的{user_content}"
+    if digest:
+        user_content += f"\n\n全量评论的主题聚类 (仅关注与【{target_type}】相关的主题)：\n{digest}"
     try:
         response = client.chat.completions.create(
             model="deepseek-chat",
             messages=[
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"汇总摘要：\n{combined_summaries}"}
+                {"role": "user", "content": user_content}
             ],
             temperature=0.3,
             stream=False
@@ -103,78 +136,148 @@ def reduce_phase_worker(combined_summaries, game_name, sentiment_type):
         print(f"Reduce Error: {e}")
         return None
 
-def execute_granular_analysis(pos_text_series, neg_text_series, game_name):
+def review_keys(df):
+    """ 评论的稳定标识：优先使用 Steam recommendationid，缺失时用正文哈希 """
+    content_keys = df['clean_content'].map(lambda t: hashlib.sha1(t.encode('utf-8')).hexdigest()[:16])
+    if 'review_id' not in df: return content_keys
+    return df['review_id'].where(df['review_id'].notna(), content_keys).astype(str)
+
+def build_chunks(df, keys):
     """
-    细粒度并发调度器
+    按评论标识的哈希顺序 (与 sampling.stratified_sample 的抽样顺序一致) 装箱，每个切片不超过 CHUNK_SIZE 字
+    调用方截断切片列表时丢弃的是哈希序靠后的评论，与发布时间无关 (不会总是丢掉最新评论)
+    切片 ID 由成员评论标识决定：同一批评论在不同次运行中得到相同的切片 ID
+    返回: [(chunk_id, member_keys, text), ...]
     """
-    CHUNK_SIZE = 3000
-    MAX_CHUNKS_PER_TYPE = 4
-    
-    # 1. 准备数据切片
-    full_pos = " ".join(pos_text_series.astype(str).tolist())
-    full_neg = " ".join(neg_text_series.astype(str).tolist())
+    ordered = df.assign(_key=keys, _order=pd.util.hash_pandas_object(keys.astype(str), index=False).values)
+    ordered = ordered.sort_values(['_order', '_key'])
+    chunks, members, texts, size = [], [], [], 0
+
+    def _flush():
+        chunk_id = hashlib.sha1("|".join(members).encode('utf-8')).hexdigest()[:16]
+        chunks.append((chunk_id, list(members), " ".join(texts)))
+
+    for key, text in zip(ordered['_key'], ordered['clean_content'].astype(str)):
+        text = text[:CHUNK_SIZE]
+        if members and size + len(text) + 1 > CHUNK_SIZE:
+            _flush()
+            members, texts, size = [], [], 0
+        members.append(key)
+        texts.append(text)
+        size += len(text) + 1
+    if members: _flush()
+    return chunks
+
+def execute_granular_analysis(df, game_name, app_id=None, on_progress=None):
+    """
+    增量式细粒度调度器 (由 LLM_SCHEDULER 控制预算、截止时间与逐切片降级)
+    1. 只对尚未被历史结论覆盖的新评论做分层抽样 + 切片
+    2. 已有 Map 摘要的切片直接复用
+    3. Reduce 把新摘要与上一次的结论合并，成功后登记本次覆盖的评论
+    不依赖 Streamlit，可在后台任务中运行；on_progress(progress, message) 用于上报进度
+    """
+    report = on_progress or (lambda progress, message: None)
+    scope = str(app_id or game_name)
     
-    pos_chunks = [full_pos[i:i+CHUNK_SIZE] for i in range(0, len(full_pos), CHUNK_SIZE)][:MAX_CHUNKS_PER_TYPE]
-    neg_chunks = [full_neg[i:i+CHUNK_SIZE] for i in range(0, len(full_neg), CHUNK_SIZE)][:MAX_CHUNKS_PER_TYPE]
+    # 0. CPU 主题发现：紧凑的聚类摘要交给 Reduce，原文切片数随之减少
+    topic_list = topics.discover_topics(df, scope, review_keys(df))
+    digest = topics.cluster_digest(topic_list)
+    max_chunks = MAX_CHUNKS_WITH_TOPICS if digest else MAX_CHUNKS_PER_TYPE
+    char_budget = CHUNK_SIZE * max_chunks
     
-    total_map_tasks = len(pos_chunks) + len(neg_chunks)
-    if total_map_tasks == 0: return None
+    # 同一 scope 的刷新串行执行：读取上次结论/已覆盖评论到提交新结论之间不能被其他刷新穿插，
+    # 否则后提交的合并会覆盖先提交的结论，而两次的评论都被登记为已覆盖
+    with insight_store.refresh_lock(scope):
+        # 1. 准备增量切片 (好评/差评分别按游玩时长分层抽样，样本量按切片字数预算估算)
+        plans = {}
+        tasks, task_chunks, task_rank = [], [], []
+        cached_chunks = 0
+        for st_type, voted_up in (("positive", True), ("negative", False)):
+            part = df[df['voted_up'] == voted_up]
+            keys = review_keys(part)
+            new_mask = ~keys.isin(insight_store.seen_keys(scope, st_type))
+            new_part, new_keys = part[new_mask], keys[new_mask]
+        
+            avg_len = max(new_part['clean_content'].str.len().mean(), 1) if not new_part.empty else 1
+            subset = sampling.stratified_sample(new_part, int(char_budget / avg_len) + 1)
+            chunks = build_chunks(subset, new_keys.loc[subset.index])[:max_chunks]
+            cached = insight_store.get_summaries(scope, st_type, [c[0] for c in chunks])
+            cached_chunks += len(cached)
+        
+            plans[st_type] = {
+                "part": part,
+                "new_keys": new_keys,
+                "previous": insight_store.get_reduced(scope, st_type),
+                "summaries": list(cached.values()),
+                "chunked": {k for c in chunks for k in c[1]},
+                "local_members": set(),
+            }
+            pending = [c for c in chunks if c[0] not in cached]
+            label = "好评切片" if voted_up else "差评切片"
+            for i, (chunk_id, members, text) in enumerate(pending):
+                tasks.append(((text, game_name, st_type, app_id), text, f"{label} {i+1}/{len(pending)}"))
+                task_chunks.append((st_type, chunk_id, members))
+                task_rank.append(i)
     
-    map_results = {"positive": [], "negative": []}
+        if not tasks and not any(p["summaries"] or p["previous"] for p in plans.values()): return None
     
-    # 2. Map 阶段并发执行
-    # 修改点：初始提示文案
-    progress_bar = st.progress(0, text="正在初始化并发分析任务，请稍后：）...")
-    completed_tasks = 0
+        # 2. Map 阶段：并发 + 截止时间，掉队/失败切片逐个降级到本地引擎
+        report(0, "正在初始化并发分析任务，请稍后：）...")
+        # 好评/差评切片交替排列：预算不足时两种情感均摊降级，而不是总牺牲排在最后的差评切片
+        order = sorted(range(len(tasks)), key=lambda j: task_rank[j])
+        tasks, task_chunks = [tasks[j] for j in order], [task_chunks[j] for j in order]
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
-        futures = []
-        
-        # 提交好评任务
-        for i, chunk in enumerate(pos_chunks):
-            f = executor.submit(map_phase_worker, (chunk, game_name, "positive"))
-            f.meta_info = f"好评切片 {i+1}/{len(pos_chunks)}"
-            futures.append(f)
-            
-        # 提交差评任务
-        for i, chunk in enumerate(neg_chunks):
-            f = executor.submit(map_phase_worker, (chunk, game_name, "negative"))
-            f.meta_info = f"差评切片 {i+1}/{len(neg_chunks)}"
-            futures.append(f)
-            
-        # 监听进度
-        for future in concurrent.futures.as_completed(futures):
-            completed_tasks += 1
-            st_type, summary = future.result()
-            if summary:
-                map_results[st_type].append(summary)
-            
-            # 计算进度
-            map_progress = (completed_tasks / total_map_tasks) * 0.9
-            
-            # === 修改点：这里的文案改成了你要求的 ===
-            progress_bar.progress(map_progress, text=f"正在以并发结构分析评论，请稍后：） (当前处理: {future.meta_info})")
-            
-    # 3. Reduce 阶段
-    progress_bar.progress(0.92, text="⚡ 正在聚合语义并提取实体 (Reduce Phase)...")
+        def _on_progress(done, total, label, source):
+            suffix = "" if source == "llm" else " · 本地降级"
+            report((done / total) * 0.9, f"正在以并发结构分析评论，请稍后：） (当前处理: {label}{suffix})")
     
-    final_res = {}
+        # worker 返回 (sentiment_type, summary)：元组恒为真，需按摘要是否为空判断成功
+        map_out = LLM_SCHEDULER.run_map(tasks, map_phase_worker, map_phase_fallback, on_progress=_on_progress,
+                                        reserve_tokens=len(plans) * REDUCE_TOKENS,
+                                        is_success=lambda r: bool(r[1] and r[1].strip())) if tasks else []
     
-    # Reduce Positive
-    if map_results["positive"]:
-        pos_out = reduce_phase_worker("\n---\n".join(map_results["positive"]), game_name, "positive")
-        final_res["positive"] = pos_out
+        local_chunks = 0
+        for ((_, summary), source), (st_type, chunk_id, members) in zip(map_out, task_chunks):
+            plan = plans[st_type]
+            if summary: plan["summaries"].append(summary)
+            if source == "llm" and summary:
+                insight_store.put_summary(scope, st_type, chunk_id, summary)
+            else:
+                # 本地降级的切片不登记为已覆盖，下次刷新时重新交给 LLM
+                local_chunks += 1
+                plan["local_members"].update(members)
+            
+        # 3. Reduce 阶段：与上次结论合并 (同样受截止时间约束，失败则用本地规则引擎汇总全文)
+        report(0.92, "⚡ 正在聚合语义并提取实体 (Reduce Phase)...")
     
-    # Reduce Negative
-    if map_results["negative"]:
-        neg_out = reduce_phase_worker("\n---\n".join(map_results["negative"]), game_name, "negative")
-        final_res["negative"] = neg_out
+        final_res = {}
+        local_reduces = 0
+        new_reviews = 0
+        for st_type, plan in plans.items():
+            new_reviews += len(plan["new_keys"])
+            if not plan["summaries"]:
+                # 没有新评论：直接沿用上次的结论
+                if plan["previous"]: final_res[st_type] = plan["previous"]
+                continue
+            part = plan["part"]
+            fallback = lambda p=part, t=st_type: {"insights": get_fallback_result(p['clean_content'], t, app_id, p.get('category_hits'))[0], "entities": []}
+            out, source = LLM_SCHEDULER.call(reduce_phase_worker, "\n---\n".join(plan["summaries"]), game_name, st_type, plan["previous"], digest, fallback=fallback)
+            final_res[st_type] = out
+            if source == "llm":
+                # 只登记实际进入切片且由 LLM 摘要的评论；未被抽中的评论留待下次刷新
+                covered = [k for k in plan["chunked"] if k not in plan["local_members"]]
+                insight_store.commit_reduced(scope, st_type, out, covered)
+            else:
+                local_reduces += 1
         
-    progress_bar.progress(1.0, text="✅ 分析完成")
-    time.sleep(0.5) 
-    progress_bar.empty()
+        final_res["_meta"] = {"map_total": len(tasks) + cached_chunks, "map_local": local_chunks, "map_cached": cached_chunks,
+                              "reduce_local": local_reduces, "new_reviews": new_reviews}
+        # 主题卡片直接复用本次聚类结果，页面无需在脚本线程中重新聚类
+        final_res["_topics"] = topic_list
+        
+        report(1.0, "✅ 分析完成")
     
-    return final_res
+        return final_res
 
 # =======================================================
 # 3. RAG 核心逻辑
@@ -263,24 +366,30 @@ def process_llm_result(llm_json_result):
     
     return insights, entities
 
-def get_fallback_result(text_series, sentiment_type):
-    category_scores = []
-    db_key = "通用" 
-    current_db = LOCAL_FALLBACK_DB.get(db_key).get(sentiment_type, {})
-    full_text = " ".join(text_series.astype(str).tolist())
-    for category, info in current_db.items():
-        score = 0
-        for kw in info['kws']: score += len(re.findall(kw, full_text, re.IGNORECASE))
-        if score > 0: category_scores.append({"category": category, "score": score, "desc": info['desc']})
-    sorted_cats = sorted(category_scores, key=lambda x: x['score'], reverse=True)
-    top_3 = sorted_cats[:3]
+def get_fallback_result(text_series, sentiment_type, app_id=None, category_hits=None):
+    """
+    本地规则引擎：category_hits 为清洗阶段单次扫描得到的分类命中 (避免重复扫描全文)，
+    缺失时才对 text_series 现场扫描
+    """
+    index = keyword_index.get_index(app_id)
+    if category_hits is None:
+        category_hits = [index.scan(t)[1] for t in text_series.astype(str)]
+    else:
+        category_hits = [keyword_index.hits_from_column(hits) for hits in category_hits]
+    totals = {}
+    for hits in category_hits:
+        for key, n in hits.items(): totals[key] = totals.get(key, 0) + n
+    top_3 = index.rank(totals, sentiment_type)[:3]
     if len(top_3) >= 1: top_3[0]['is_dominant'] = True
     return top_3, []
 
 # =======================================================
 # 6. 主函数
 # =======================================================
-def run(df, game_name="通用游戏"):
+def run(df, game_name="通用游戏", app_id=None, source_job=None):
+    """
+    source_job: 产出 df 的清洗任务 ID；提供时深度洞察作为后台任务执行，刷新页面后可重新挂载
+    """
     if df.empty:
         st.warning("⚠️ 数据为空")
         return
@@ -292,7 +401,8 @@ def run(df, game_name="通用游戏"):
         col1, col2 = st.columns([2, 1], gap="large")
         with col1:
             st.markdown("**游玩时长分布**")
-            chart = alt.Chart(df).mark_circle(size=80, opacity=0.6).encode(
+            # 只传入图表用到的列 (内部列如 category_hits 不参与序列化)
+            chart = alt.Chart(df[['playtime_hours', 'votes_up', 'voted_up', 'clean_content']]).mark_circle(size=80, opacity=0.6).encode(
                 x=alt.X('playtime_hours', title='Hours Played'),
                 y=alt.Y('votes_up', title='Helpful Votes'),
                 color=alt.Color('voted_up', scale=alt.Scale(range=['#FF3B30', '#34C759']), legend=None),
@@ -302,15 +412,20 @@ def run(df, game_name="通用游戏"):
         with col2:
             st.markdown("**核心指标**")
             pos_rate = df['voted_up'].mean() * 100
-            churn_rate = len(df[(df['playtime_hours']<=2) & (df['voted_up']==False)]) / len(df) * 100
+            churn_count = len(df[(df['playtime_hours']<=2) & (df['voted_up']==False)])
+            churn_rate = churn_count / len(df) * 100
+            pos_margin = sampling.wilson_width(int(df['voted_up'].sum()), len(df)) * 50
+            churn_margin = sampling.wilson_width(churn_count, len(df)) * 50
             st.markdown(f"""
             <div style="background:white; padding:20px; border-radius:16px; margin-bottom:15px; box-shadow:0 4px 10px rgba(0,0,0,0.03);">
                 <div style="color:#86868B; font-size:13px; font-weight:500;">总体好评率</div>
                 <div style="color:#1D1D1F; font-size:32px; font-weight:700;">{pos_rate:.1f}%</div>
+                <div style="color:#86868B; font-size:12px;">95% 置信区间 ±{pos_margin:.1f}%</div>
             </div>
             <div style="background:white; padding:20px; border-radius:16px; box-shadow:0 4px 10px rgba(0,0,0,0.03);">
                 <div style="color:#86868B; font-size:13px; font-weight:500;">2小时劝退率</div>
                 <div style="color:{'#34C759' if churn_rate < 1 else '#FF3B30'}; font-size:32px; font-weight:700;">{churn_rate:.1f}%</div>
+                <div style="color:#86868B; font-size:12px;">95% 置信区间 ±{churn_margin:.1f}%</div>
             </div>
             """, unsafe_allow_html=True)
 
@@ -341,7 +456,7 @@ def run(df, game_name="通用游戏"):
             if "sk-" in DEEPSEEK_API_KEY:
                 churn_reasons = analyze_refund_reasons(refund_neg_df['clean_content'], game_name)
             else:
-                churn_reasons, _ = get_fallback_result(refund_neg_df['clean_content'], "negative")
+                churn_reasons, _ = get_fallback_result(refund_neg_df['clean_content'], "negative", app_id, refund_neg_df.get('category_hits'))
             
             if churn_reasons:
                 st.markdown(f"**🚨 核心劝退原因 (Top {len(churn_reasons)})**")
@@ -363,25 +478,45 @@ def run(df, game_name="通用游戏"):
     
     if 'analysis_cache' not in st.session_state: st.session_state.analysis_cache = {}
     if 'last_game_analyzed' not in st.session_state: st.session_state.last_game_analyzed = ""
+    if 'analysis_source' not in st.session_state: st.session_state.analysis_source = {}
     cache_key = game_name
-    need_analysis = (cache_key != st.session_state.last_game_analyzed) or (cache_key not in st.session_state.analysis_cache)
+    # 数据版本：新的清洗结果 (任务 ID 变化) 触发增量刷新，而不是继续展示旧结论
+    data_version = source_job or len(df)
+    need_analysis = (cache_key != st.session_state.last_game_analyzed) or (cache_key not in st.session_state.analysis_cache) \
+                    or (st.session_state.analysis_source.get(cache_key) != data_version)
 
     pos_insights, pos_entities, neg_insights, neg_entities = [], [], [], []
     model_used = "本地规则引擎 (Rule-Based)"
 
     if need_analysis:
-        pos_texts = df[df['voted_up'] == True]['clean_content']
-        neg_texts = df[df['voted_up'] == False]['clean_content']
+        pos_df = df[df['voted_up'] == True]
+        neg_df = df[df['voted_up'] == False]
+        pos_texts = pos_df['clean_content']
+        neg_texts = neg_df['clean_content']
         
-        if "sk-" in DEEPSEEK_API_KEY:
-            llm_results = execute_granular_analysis(pos_texts, neg_texts, game_name)
-            if llm_results:
-                st.session_state.analysis_cache[cache_key] = llm_results
-                st.session_state.last_game_analyzed = cache_key
-                model_used = "DeepSeek (Granular Map-Reduce)"
+        use_llm = "sk-" in DEEPSEEK_API_KEY and LLM_SCHEDULER.is_healthy()
+        llm_results = None
+        if use_llm and source_job:
+            # 后台执行：相同参数的任务会被去重复用，刷新页面后直接挂载到同一任务
+            job_id = jobs.submit("analyze", {"source_job": source_job, "game_name": game_name, "app_id": app_id})
+            job = jobs.attach(job_id, "🧠 深度语义分析")
+            if job is None: return  # 任务运行中，进度轮询结束后自动刷新页面
+            if job["status"] == "failed": st.warning(f"⚠️ 深度分析任务失败，已切换本地规则引擎：{job['error']}")
+            llm_results = jobs.load_result(job)
+        elif use_llm:
+            progress_bar = st.progress(0)
+            llm_results = execute_granular_analysis(df, game_name, app_id,
+                                                    on_progress=lambda p, m: progress_bar.progress(p, text=m))
+            time.sleep(0.5)
+            progress_bar.empty()
+        
+        st.session_state.analysis_source[cache_key] = data_version
+        if llm_results:
+            st.session_state.analysis_cache[cache_key] = llm_results
+            st.session_state.last_game_analyzed = cache_key
         else:
-            p_in, _ = get_fallback_result(pos_texts, "positive")
-            n_in, _ = get_fallback_result(neg_texts, "negative")
+            p_in, _ = get_fallback_result(pos_texts, "positive", app_id, pos_df.get('category_hits'))
+            n_in, _ = get_fallback_result(neg_texts, "negative", app_id, neg_df.get('category_hits'))
             st.session_state.analysis_cache[cache_key] = {
                 "positive": {"insights": p_in, "entities": []},
                 "negative": {"insights": n_in, "entities": []}
@@ -392,7 +527,15 @@ def run(df, game_name="通用游戏"):
         cached = st.session_state.analysis_cache[cache_key]
         if "positive" in cached: pos_insights, pos_entities = process_llm_result(cached["positive"])
         if "negative" in cached: neg_insights, neg_entities = process_llm_result(cached["negative"])
-        if "sk-" in DEEPSEEK_API_KEY: model_used = "DeepSeek (Granular Map-Reduce)"
+        meta = cached.get("_meta")
+        if meta:
+            local_parts = meta["map_local"] + meta["reduce_local"]
+            if local_parts == 0: model_used = "DeepSeek (Granular Map-Reduce)"
+            elif meta["map_local"] < meta["map_total"]: model_used = f"DeepSeek + 本地降级 ({meta['map_local']}/{meta['map_total']} 切片降级)"
+            if "new_reviews" in meta and not model_used.startswith("本地"):
+                model_used += f" · 增量刷新：{meta['new_reviews']} 条新评论，复用 {meta['map_cached']} 个切片摘要"
+        elif "sk-" in DEEPSEEK_API_KEY:
+            model_used = "本地规则引擎 (DeepSeek 熔断保护中)"
 
     st.caption(f"🚀 分析引擎状态: **{model_used}**")
     
@@ -425,6 +568,40 @@ def run(df, game_name="通用游戏"):
     with c_insight1: render_insight_card("✅ 核心优势", pos_insights, pos_entities, "#34C759", "✨ 高光时刻 / 明星关卡")
     with c_insight2: render_insight_card("❌ 核心痛点", neg_insights, neg_entities, "#FF3B30", "💀 重点改进元素 / 问题关卡")
 
+    # --- Part 3.5: 主题发现 (CPU 聚类，与引擎状态无关) ---
+    st.write("")
+    st.markdown("### 🧩 评论主题发现")
+    st.caption("字符 n-gram TF-IDF + Mini-Batch K-Means，自动归纳玩家讨论的主题簇")
+    # 深度分析任务已聚类时直接复用；仅本地规则引擎模式下在页面中聚类 (按数据版本缓存)
+    topic_list = st.session_state.analysis_cache.get(cache_key, {}).get("_topics")
+    if topic_list is None:
+        if 'topic_cache' not in st.session_state: st.session_state.topic_cache = {}
+        cached_topics = st.session_state.topic_cache.get(cache_key)
+        if cached_topics is None or cached_topics[0] != data_version:
+            cached_topics = (data_version, topics.discover_topics(df, str(app_id or game_name), review_keys(df)))
+            st.session_state.topic_cache[cache_key] = cached_topics
+        topic_list = cached_topics[1]
+    if not topic_list:
+        st.info("样本不足，无法进行主题聚类")
+    else:
+        topic_cols = st.columns(2, gap="large")
+        for i, t in enumerate(topic_list):
+            sample = t["representatives"][0] if t["representatives"] else ""
+            sample = sample[:120] + "..." if len(sample) > 120 else sample
+            with topic_cols[i % 2]:
+                st.markdown(f"""
+                <div style="background:white; border-radius:14px; padding:18px; margin-bottom:12px; border:1px solid rgba(0,0,0,0.03); box-shadow:0 4px 12px rgba(0,0,0,0.03);">
+                    <div style="display:flex; justify-content:space-between; margin-bottom:8px;">
+                        <span style="font-size:15px; font-weight:600; color:#1D1D1F;">{t['label']}</span>
+                        <span style="font-size:12px; color:#86868B;">{t['size']} 条</span>
+                    </div>
+                    <div style="display:flex; height:6px; width:100%; border-radius:3px; overflow:hidden; margin-bottom:10px;">
+                        <div style="width:{t['pos_share'] * 100:.0f}%; background:#34C759;"></div>
+                        <div style="width:{t['neg_share'] * 100:.0f}%; background:#FF3B30;"></div>
+                    </div>
+                    <div style="font-size:12px; color:#6E6E73; line-height:1.5;">“{sample}”</div>
+                </div>""", unsafe_allow_html=True)
+
     # --- Part 4: RAG ---
     st.write("")
     st.markdown("---")
@@ -0,0 +1,122 @@
+import io
+import os
+import json
+import glob
+import gzip
+import time
+import uuid
+import pandas as pd
+
+try:
+    import zstandard as zstd
+except ImportError:  # 未安装 zstandard 时退回 gzip (同样支持多段追加)
+    zstd = None
+
+# =======================================================
+# 🔧 原始页面归档配置
+# =======================================================
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "archive")
+ZSTD_LEVEL = 3
+SEGMENT_EXT = ".jsonl.zst" if zstd else ".jsonl.gz"
+# 读取损坏分段时可能抛出的异常 (zstd.ZstdError 只继承 Exception，需单独列出)
+READ_ERRORS = (EOFError, OSError, RuntimeError) + ((zstd.ZstdError,) if zstd else ())
+
+# 每页一行：{"app_id", "language", "cursor", "fetched_at", "reviews": [Steam 原始评论 JSON, ...]}
+# 每次采集会话写一个只追加的分段文件，每页压缩为独立的 frame/member，崩溃时最多丢失最后一页
+
+
+class ArchiveWriter:
+    """ 单次采集会话的只追加写入器 """
+
+    def __init__(self, app_id, language="schinese"):
+        self.app_id = str(app_id)
+        self.language = language
+        folder = os.path.join(ARCHIVE_DIR, self.app_id)
+        os.makedirs(folder, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{language}-{uuid.uuid4().hex[:8]}{SEGMENT_EXT}"
+        self.path = os.path.join(folder, name)
+        self.pages = 0
+        self._cctx = zstd.ZstdCompressor(level=ZSTD_LEVEL) if zstd else None
+
+    def append(self, cursor, reviews, next_cursor=None):
+        record = {
+            "app_id": self.app_id,
+            "language": self.language,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "fetched_at": int(time.time()),
+            "reviews": reviews,
+        }
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        payload = self._cctx.compress(line) if self._cctx else gzip.compress(line)
+        with open(self.path, "ab") as f:
+            f.write(payload)
+        self.pages += 1
+
+    def sync(self):
+        """ 强制落盘 (断点保存前调用) """
+        if not os.path.exists(self.path): return
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# =======================================================
+# 回放读取
+# =======================================================
+def list_segments(app_id):
+    folder = os.path.join(ARCHIVE_DIR, str(app_id))
+    return sorted(glob.glob(os.path.join(folder, "*.jsonl.zst")) + glob.glob(os.path.join(folder, "*.jsonl.gz")))
+
+def _open_segment(path):
+    if path.endswith(".zst"):
+        if zstd is None: raise RuntimeError(f"读取 {path} 需要安装 zstandard")
+        stream = zstd.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(io.BufferedReader(stream), encoding="utf-8")
+    return gzip.open(path, "rt", encoding="utf-8")
+
+def read_segment(path):
+    """ 逐页读取单个分段；末尾被截断的页 (采集中途崩溃) 或损坏的 frame 之后的内容会被跳过 """
+    try:
+        with _open_segment(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+    except READ_ERRORS as e:
+        print(f"Archive Read Error ({path}): {e}")
+
+def iter_pages(app_id, language=None):
+    """ 按写入顺序逐页读取归档 """
+    for path in list_segments(app_id):
+        for page in read_segment(path):
+            if language and page.get("language") != language: continue
+            yield page
+
+def _get_path(obj, path):
+    for key in path.split("."):
+        if not isinstance(obj, dict): return None
+        obj = obj.get(key)
+    return obj
+
+def project(review, fields):
+    """
+    字段投影：fields 为 {列名: "点号路径" 或 callable(review)}
+    例如 {"playtime": "author.playtime_forever", "score": "weighted_vote_score"}
+    """
+    return {col: (src(review) if callable(src) else _get_path(review, src)) for col, src in fields.items()}
+
+def replay(app_id, fields, language=None):
+    """
+    从归档重建 DataFrame (无需重新请求 Steam)
+    同一 recommendationid 出现多次时保留最新抓取的版本
+    """
+    latest = {}
+    for page in iter_pages(app_id, language):
+        for r in page.get("reviews", []):
+            r.setdefault("language", page.get("language"))
+            latest[r.get("recommendationid") or id(r)] = r
+    return pd.DataFrame([project(r, fields) for r in latest.values()], columns=list(fields))
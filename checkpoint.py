@@ -0,0 +1,61 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# =======================================================
+# 🔧 采集断点 (SQLite)
+# =======================================================
+# 每个 (任务 key, 语言) 一行：记录本次采集写入的归档分段列表、已完成页数与下一页游标
+# 评论批次本身保存在归档分段中 (archive.py，每页一个压缩 frame)，断点只保存指针；
+# 恢复后新页面写入新的分段 (旧分段末尾可能有被截断的 frame，不能继续追加)
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "checkpoints.sqlite")
+CHECKPOINT_EVERY = 5   # 每采集 N 页落盘一次断点
+
+_INIT_LOCK = threading.Lock()
+_initialized = False
+
+def _connect():
+    global _initialized
+    with _INIT_LOCK:
+        if not _initialized:
+            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+            with sqlite3.connect(DB_PATH, timeout=30) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+                        key TEXT NOT NULL,
+                        language TEXT NOT NULL,
+                        segments TEXT NOT NULL,
+                        pages INTEGER NOT NULL,
+                        cursor TEXT NOT NULL,
+                        finished INTEGER NOT NULL DEFAULT 0,
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (key, language)
+                    )
+                """)
+            _initialized = True
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def load(key, language):
+    """ 读取未完成的断点，返回 dict 或 None (已完成的采集不会被恢复) """
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM scrape_checkpoints WHERE key = ? AND language = ? AND finished = 0",
+                           (key, language)).fetchone()
+    if row is None: return None
+    ckpt = dict(row)
+    ckpt["segments"] = json.loads(ckpt["segments"])
+    return ckpt
+
+def save(key, language, segments, pages, cursor):
+    with _connect() as conn:
+        conn.execute("INSERT OR REPLACE INTO scrape_checkpoints VALUES (?, ?, ?, ?, ?, 0, ?)",
+                     (key, language, json.dumps(segments), pages, cursor, time.time()))
+
+def finish(key, language):
+    with _connect() as conn:
+        conn.execute("UPDATE scrape_checkpoints SET finished = 1, updated_at = ? WHERE key = ? AND language = ?",
+                     (time.time(), key, language))
@@ -1,70 +1,68 @@
 import pandas as pd
-import re
 import streamlit as st
+import keyword_index
 
-# --- 简易关键词库 (用于计算相关度权重) ---
-# 只要命中这些词，说明评论内容与游戏核心体验高度相关
-RELEVANCE_KEYWORDS = {
-    "通用": ["画面", "画质", "优化", "掉帧", "卡顿", "剧情", "故事", "手感", "打击感", "BGM", "音乐", "配音", "BUG", "闪退", "服务器", "联机", "好玩", "无聊"],
-    "黑神话": ["空气墙", "定身", "大头", "虎先锋", "西游", "神话", "美术", "古建", "动作", "棍法", "劈棍", "戳棍", "立棍", "变身", "葫芦", "妖怪", "天命人"],
-    "星空": ["飞船", "造船", "加载", "黑屏", "读条", "星球", "空旷", "探索", "NASA", "贝塞斯达", "陶德", "任务", "阵营", "哨站", "改装"],
-    "艾尔登": ["开放世界", "女武神", "碎星", "老婆", "菈妮", "梅琳娜", "受苦", "骨灰", "战技", "法环", "宫崎英高", "指头", "黄金树"],
-    "幻兽": ["帕鲁", "宝可梦", "缝合", "打工", "流水线", "资本", "压榨", "配种", "词条", "联机", "服务器", "球"],
-    "赛博朋克": ["夜之城", "强尼", "银手", "义体", "黑客", "大厦", "荒坂", "浮空车", "光追", "甚至", "动画", "边缘行者"]
+# --- 按语言的文本长度计分后端 (均为向量化 str.count) ---
+# (正则, 权重)：权重把不同书写系统的长度折算到“汉字数”量级，保证同一套阈值可用
+# 字符类使用字面字符 (非 raw 字符串)：Arrow 字符串后端的 RE2 不支持 \u / \U 转义
+CJK_CHARS = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\U00020000-\U0003134f'
+SCORING_BACKENDS = {
+    "cjk": (f'[{CJK_CHARS}]', 1.0),                       # 中文：完整 CJK 统一表意文字 (含扩展区)
+    "japanese": (f'[{CJK_CHARS}\u3040-\u30ff]', 1.0),     # 日文：汉字 + 假名
+    "korean": ('[\uac00-\ud7af]', 1.0),                    # 韩文：谚文音节
+    "words": (r'[^\W\d_]+', 2.0),                          # 拉丁/西里尔等空格分词语言：单词数
 }
+LANGUAGE_BACKENDS = {"schinese": "cjk", "tchinese": "cjk", "japanese": "japanese", "koreana": "korean"}
+DEFAULT_LANGUAGE = "schinese"
 
-def process_data(df, min_pos_score=10, min_neg_score=5, game_name="通用"):
+# 评论平台残留的噪声片段
+NOISE_PATTERN = r'展开\d+条.*|查看更多.*|IP属地.*|\d{4}-\d{1,2}-\d{1,2}'
+
+def text_length(texts, languages):
+    """
+    按语言选择计分后端，返回折算后的文本长度 (与 texts 同索引)
+    每个后端只处理自己语言的子集，总耗时与单语言一次扫描相当
+    """
+    backends = languages.map(lambda lang: LANGUAGE_BACKENDS.get(lang, "words"))
+    lengths = pd.Series(0.0, index=texts.index)
+    for backend, idx in texts.groupby(backends).groups.items():
+        pattern, weight = SCORING_BACKENDS[backend]
+        lengths.loc[idx] = texts.loc[idx].str.count(pattern) * weight
+    return lengths.round().astype(int)
+
+def process_data(df, min_pos_score=10, min_neg_score=5, app_id=None):
     """
     逻辑层：基于【字数 + 相关度】的加权筛选
     min_pos_score: 好评的最低质量分
     min_neg_score: 差评的最低质量分
+    app_id: 用于加载对应游戏的关键词词典 (见 dictionaries/)
     """
     if df.empty: return df
     
-    # 1. 确定当前游戏的关键词列表
-    # 简单的模糊匹配逻辑
-    db_key = "通用"
-    for key in RELEVANCE_KEYWORDS.keys():
-        if key in game_name:
-            db_key = key
-            break
-    keywords = RELEVANCE_KEYWORDS[db_key] + RELEVANCE_KEYWORDS["通用"]
+    # 1. 获取当前游戏的共享关键词索引 (通用 + 游戏词典，文件变更时自动热加载)
+    index = keyword_index.get_index(app_id)
     
-    # 2. 定义清洗与打分函数
-    def _clean_text(text):
-        if not isinstance(text, str): return ""
-        text = re.sub(r'展开\d+条.*', '', text)
-        text = re.sub(r'查看更多.*', '', text)
-        text = re.sub(r'IP属地.*', '', text)
-        text = re.sub(r'\d{4}-\d{1,2}-\d{1,2}', '', text)
-        text = re.sub(r'\n+', ' ', text)
-        return text.strip()
-
-    def _calculate_score(text):
-        if not isinstance(text, str): return 0
-        
-        # A. 基础分：汉字数量
-        chinese_count = len(re.findall(r'[\u4e00-\u9fa5]', text))
-        
-        # B. 加权分：关键词命中数 (每个关键词 = 5 分权重)
-        # 这意味着：如果你提到了 1 个核心词（如“空气墙”），相当于你多写了 5 个字
-        keyword_hits = 0
-        for kw in keywords:
-            if kw in text:
-                keyword_hits += 1
-        
-        # 总分 = 字数 + (关键词数 * 5)
-        total_score = chinese_count + (keyword_hits * 5)
-        return total_score
-
-    # 3. 执行处理
+    # 2. 向量化清洗
     df_clean = df.copy()
-    df_clean['clean_content'] = df_clean['content'].apply(_clean_text)
+    if 'language' not in df_clean: df_clean['language'] = DEFAULT_LANGUAGE
+    df_clean['language'] = df_clean['language'].fillna(DEFAULT_LANGUAGE)
+    content = df_clean['content'].where(df_clean['content'].map(lambda x: isinstance(x, str)), "")
+    df_clean['clean_content'] = (content.str.replace(NOISE_PATTERN, '', regex=True)
+                                        .str.replace(r'\n+', ' ', regex=True)
+                                        .str.strip())
+    
+    # 3. 打分
+    # 单次扫描：同时得到相关度命中数与规则引擎分类命中 (后者供 analyzer 的 Fallback 直接汇总)
+    scans = df_clean['clean_content'].apply(index.scan)
+    df_clean['keyword_hits'] = scans.str[0]
+    df_clean['category_hits'] = scans.str[1].map(keyword_index.hits_to_column)
+    # 按语言折算的文本长度 (中文即汉字数)
+    df_clean['text_len'] = text_length(df_clean['clean_content'], df_clean['language'])
     
-    # 计算质量分
-    df_clean['quality_score'] = df_clean['clean_content'].apply(_calculate_score)
-    # 计算纯字数 (为了后续展示用)
-    df_clean['chinese_len'] = df_clean['clean_content'].apply(lambda x: len(re.findall(r'[\u4e00-\u9fa5]', x)))
+    # A. 基础分：折算字数
+    # B. 加权分：关键词命中数 (每个关键词 = 5 分权重)
+    # 这意味着：如果你提到了 1 个核心词（如“空气墙”），相当于你多写了 5 个字
+    df_clean['quality_score'] = df_clean['text_len'] + (df_clean['keyword_hits'] * 5)
     
     # 4. 双轨过滤 (基于 Quality Score 而不是纯字数)
     mask_pos = (df_clean['voted_up'] == True) & (df_clean['quality_score'] >= min_pos_score)
@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+import uuid
+import zipfile
+import pandas as pd
+import streamlit as st
+
+# =======================================================
+# 🔧 导出配置
+# =======================================================
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "exports")
+CHUNK_ROWS = 5000
+FORMATS = {"CSV": "csv", "Parquet": "parquet", "JSONL": "jsonl"}
+# 导出时排除的内部列 (非标量，无法写入表格格式)
+INTERNAL_COLUMNS = ["category_hits"]
+
+# =======================================================
+# 1. 数据准备
+# =======================================================
+def _export_frame(df):
+    return df.drop(columns=INTERNAL_COLUMNS, errors="ignore")
+
+def dataset_hash(df, insights=None):
+    """ 数据集 + 洞察结果的内容哈希，作为导出缓存的 key """
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(_export_frame(df), index=False).values.tobytes())
+    h.update(",".join(map(str, df.columns)).encode("utf-8"))
+    h.update(json.dumps(insights or {}, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def trend_rollup(df):
+    """ 按天汇总的趋势数据：评论数、好评率、2 小时差评数、平均时长 """
+    if df.empty or "create_time" not in df: return pd.DataFrame()
+    day = pd.to_datetime(df["create_time"], unit="s").dt.floor("D").rename("date")
+    early_neg = (df["playtime_hours"] <= 2) & (df["voted_up"] == False)
+    grouped = df.assign(early_neg=early_neg).groupby(day)
+    return pd.DataFrame({
+        "reviews": grouped.size(),
+        "positive_rate": grouped["voted_up"].mean().round(4),
+        "early_negative": grouped["early_neg"].sum(),
+        "avg_playtime_hours": grouped["playtime_hours"].mean().round(1),
+    }).reset_index()
+
+# =======================================================
+# 2. 分块写入
+# =======================================================
+def _chunks(df):
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+def _write_csv(df, f):
+    for i, chunk in enumerate(_chunks(df)):
+        f.write(chunk.to_csv(index=False, header=(i == 0)).encode("utf-8-sig" if i == 0 else "utf-8"))
+
+def _write_jsonl(df, f):
+    for chunk in _chunks(df):
+        text = chunk.to_json(orient="records", lines=True, force_ascii=False)
+        if not text.endswith("\n"): text += "\n"
+        f.write(text.encode("utf-8"))
+
+def _write_parquet(df, f):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(f, schema) as writer:
+        for chunk in _chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+
+def build_report(df, insights=None, fmt="csv"):
+    """
+    生成报告压缩包 (评论明细 + 洞察 JSON + 趋势汇总)，按数据集哈希缓存到磁盘
+    只在用户请求导出时调用；重复请求直接复用已生成的文件
+    返回: 压缩包路径
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"report-{dataset_hash(df, insights)}-{fmt}.zip")
+    if os.path.exists(path): return path
+
+    # 临时文件名唯一：多个会话同时导出同一数据集时互不覆盖，os.replace 保证最终文件完整
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        # zip 条目以流方式写入，明细数据按块追加，不在内存中拼接完整文件
+        with zf.open(f"reviews.{fmt}", "w", force_zip64=True) as f:
+            WRITERS[fmt](_export_frame(df), f)
+        with zf.open("trends.csv", "w") as f:
+            _write_csv(trend_rollup(df), f)
+        if insights:
+            zf.writestr("insights.json", json.dumps(insights, ensure_ascii=False, indent=2, default=str))
+    os.replace(tmp_path, path)
+    return path
+
+# =======================================================
+# 3. 展示层
+# =======================================================
+def show_ui(df, insights=None):
+    """ 导出面板：选择格式 -> 生成 (按需) -> 下载 """
+    c_fmt, c_gen, c_dl = st.columns([1, 1, 1], gap="small")
+    with c_fmt:
+        fmt_label = st.selectbox("导出格式", list(FORMATS.keys()), label_visibility="collapsed", key="export_fmt")
+    fmt = FORMATS[fmt_label]
+    path = None
+    with c_gen:
+        if st.button("📦 生成报告", use_container_width=True):
+            try:
+                with st.spinner("正在生成报告..."):
+                    path = build_report(df, insights, fmt)
+            except ImportError:
+                st.error("⚠️ 导出 Parquet 需要安装 pyarrow")
+    with c_dl:
+        # 下载按钮只在生成报告的这一次运行中挂载：下载按钮会把文件整体读入内存并注册到会话，
+        # 不能在之后的每次重跑中重复；再次点击生成会直接命中按数据集哈希缓存的文件
+        if path:
+            with open(path, "rb") as f:
+                st.download_button(f"📥 导出报告 (.{fmt})", data=f, file_name=f"analysis_report_{fmt}.zip",
+                                   mime="application/zip", type="primary", use_container_width=True)
@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# =======================================================
+# 🔧 增量洞察存储 (SQLite)
+# =======================================================
+# map_summaries : 每个评论切片的 Map 摘要 (切片 ID 由成员评论 ID 决定，跨次运行稳定)
+# reduced_state : 每个 app_id × 情感 的最新 Reduce 结论
+# seen_reviews  : 已被某次 Reduce 结论覆盖的评论 ID (下次只分析其余评论)
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "insights.sqlite")
+
+_INIT_LOCK = threading.Lock()
+_initialized = False
+
+def _connect():
+    global _initialized
+    with _INIT_LOCK:
+        if not _initialized:
+            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+            with sqlite3.connect(DB_PATH, timeout=30) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS map_summaries (
+                        scope TEXT NOT NULL, sentiment TEXT NOT NULL, chunk_id TEXT NOT NULL,
+                        summary TEXT NOT NULL, created_at REAL NOT NULL,
+                        PRIMARY KEY (scope, sentiment, chunk_id)
+                    );
+                    CREATE TABLE IF NOT EXISTS reduced_state (
+                        scope TEXT NOT NULL, sentiment TEXT NOT NULL,
+                        result TEXT NOT NULL, updated_at REAL NOT NULL,
+                        PRIMARY KEY (scope, sentiment)
+                    );
+                    CREATE TABLE IF NOT EXISTS seen_reviews (
+                        scope TEXT NOT NULL, sentiment TEXT NOT NULL, review_key TEXT NOT NULL,
+                        PRIMARY KEY (scope, sentiment, review_key)
+                    );
+                """)
+            _initialized = True
+    return sqlite3.connect(DB_PATH, timeout=30)
+
+_SCOPE_LOCKS = {}
+
+def refresh_lock(scope):
+    """ 每个 scope 一把锁：增量刷新 (读取结论 -> Map/Reduce -> commit_reduced) 需整体串行 """
+    with _INIT_LOCK:
+        return _SCOPE_LOCKS.setdefault(scope, threading.Lock())
+
+# -------------------------------------------------------
+# Map 摘要
+# -------------------------------------------------------
+def get_summaries(scope, sentiment, chunk_ids):
+    """ 批量读取已缓存的切片摘要，返回 {chunk_id: summary} """
+    if not chunk_ids: return {}
+    marks = ",".join("?" * len(chunk_ids))
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT chunk_id, summary FROM map_summaries WHERE scope = ? AND sentiment = ? AND chunk_id IN ({marks})",
+            (scope, sentiment, *chunk_ids)
+        ).fetchall()
+    return dict(rows)
+
+def put_summary(scope, sentiment, chunk_id, summary):
+    with _connect() as conn:
+        conn.execute("INSERT OR REPLACE INTO map_summaries VALUES (?, ?, ?, ?, ?)",
+                     (scope, sentiment, chunk_id, summary, time.time()))
+
+# -------------------------------------------------------
+# Reduce 状态 + 已覆盖评论
+# -------------------------------------------------------
+def get_reduced(scope, sentiment):
+    with _connect() as conn:
+        row = conn.execute("SELECT result FROM reduced_state WHERE scope = ? AND sentiment = ?",
+                           (scope, sentiment)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def seen_keys(scope, sentiment):
+    with _connect() as conn:
+        rows = conn.execute("SELECT review_key FROM seen_reviews WHERE scope = ? AND sentiment = ?",
+                            (scope, sentiment)).fetchall()
+    return {r[0] for r in rows}
+
+def commit_reduced(scope, sentiment, result, review_keys):
+    """ 同一事务内更新 Reduce 结论并登记本次覆盖的评论，保证两者一致 """
+    with _connect() as conn:
+        conn.execute("INSERT OR REPLACE INTO reduced_state VALUES (?, ?, ?, ?)",
+                     (scope, sentiment, json.dumps(result, ensure_ascii=False), time.time()))
+        conn.executemany("INSERT OR IGNORE INTO seen_reviews VALUES (?, ?, ?)",
+                         [(scope, sentiment, k) for k in review_keys])
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import uuid
+import pickle
+import sqlite3
+import hashlib
+import threading
+import concurrent.futures
+import streamlit as st
+
+import scraper
+import cleaner
+
+# =======================================================
+# 🔧 后台任务配置
+# =======================================================
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DB_PATH = os.path.join(DATA_DIR, "jobs.sqlite")
+RESULT_DIR = os.path.join(DATA_DIR, "jobs")
+JOB_WORKERS = 4        # 后台 Worker 数量 (进程内共享)
+DEDUP_TTL = 10 * 60    # 已完成任务在该时间内 (秒) 被相同请求直接复用
+# 只有结果由输入唯一确定的任务才复用已完成结果；采集/重建每次都要拿到最新评论与归档
+REUSE_DONE_KINDS = ("clean", "analyze")
+POLL_INTERVAL = 1.0    # 页面轮询进度的间隔 (秒)
+JOB_RETENTION = 7 * 24 * 3600  # 已结束任务 (及其结果文件) 的保留时间 (秒)
+PRUNE_INTERVAL = 10 * 60       # 两次清理之间的最短间隔 (秒)
+
+ACTIVE_STATES = ("queued", "running")
+
+# =======================================================
+# 1. 持久化 (SQLite)
+# =======================================================
+_INIT_LOCK = threading.Lock()
+_initialized = False
+_started = False
+
+def _connect():
+    global _initialized
+    with _INIT_LOCK:
+        if not _initialized:
+            _init_db()
+            _initialized = True
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _init_db():
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    with sqlite3.connect(DB_PATH, timeout=30) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                dedup_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                result_path TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs (dedup_key, status)")
+
+def _update(job_id, **fields):
+    fields["updated_at"] = time.time()
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+def get(job_id):
+    """ 查询任务状态，返回 dict 或 None """
+    if not job_id: return None
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None: return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    return job
+
+def load_result(job):
+    """ 读取已完成任务的结果 (DataFrame / dict) """
+    if not job or job["status"] != "done" or not job["result_path"]: return None
+    with open(job["result_path"], "rb") as f:
+        return pickle.load(f)
+
+# =======================================================
+# 2. 任务处理器 (均不依赖 Streamlit 上下文)
+# =======================================================
+def _handle_scrape(params, report, key):
+    target = params["target_count"]
+    def _on_progress(current_count, page, message):
+        report(min(current_count / target, 1.0), message)
+    return scraper.collect(params["app_id"], target, on_progress=_on_progress, ci_width=params.get("ci_width"),
+                           languages=params.get("languages", ["schinese"]), checkpoint_key=key)
+
+def _handle_replay(params, report, key):
+    report(0.1, "正在从本地归档重建数据...")
+    return scraper.replay(params["app_id"])
+
+def _handle_clean(params, report, key):
+    report(0.1, "正在加载原始数据...")
+    raw = load_result(get(params["source_job"]))
+    if raw is None: raise RuntimeError("原始数据不可用，请重新采集")
+    report(0.5, "正在清洗与打分...")
+    return cleaner.process_data(raw, params["min_pos"], params["min_neg"], app_id=params["app_id"])
+
+def _handle_analyze(params, report, key):
+    import analyzer  # analyzer 依赖本模块提交任务，这里延迟导入避免循环引用
+    df = load_result(get(params["source_job"]))
+    if df is None: raise RuntimeError("清洗数据不可用，请重新清洗")
+    return analyzer.execute_granular_analysis(df, params["game_name"], params["app_id"], on_progress=report)
+
+HANDLERS = {
+    "scrape": _handle_scrape,
+    "replay": _handle_replay,
+    "clean": _handle_clean,
+    "analyze": _handle_analyze,
+}
+
+# =======================================================
+# 3. Worker 池
+# =======================================================
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_SUBMIT_LOCK = threading.Lock()
+
+def _execute(job_id):
+    job = get(job_id)
+    if job is None or job["status"] != "queued": return
+    _update(job_id, status="running", message="任务开始执行...")
+
+    def _report(progress, message):
+        _update(job_id, progress=float(progress), message=message)
+
+    try:
+        # 任务去重 key 同时作为断点标识：中断后重新排队/重新提交的相同任务从断点继续
+        result = HANDLERS[job["kind"]](job["params"], _report, job["dedup_key"])
+        result_path = os.path.join(RESULT_DIR, f"{job_id}.pkl")
+        with open(result_path, "wb") as f:
+            pickle.dump(result, f)
+        _update(job_id, status="done", progress=1.0, message="✅ 任务完成", result_path=result_path)
+    except Exception as e:
+        print(f"Job Error ({job['kind']} {job_id}): {e}")
+        _update(job_id, status="failed", message="⚠️ 任务失败", error=str(e))
+
+_last_prune = 0.0
+
+def prune(max_age=JOB_RETENTION):
+    """ 删除超过保留时间的已结束任务及其结果文件，返回删除的任务数 """
+    cutoff = time.time() - max_age
+    with _connect() as conn:
+        rows = conn.execute("SELECT id, result_path FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                            (cutoff,)).fetchall()
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+    for row in rows:
+        if row["result_path"] and os.path.exists(row["result_path"]):
+            os.remove(row["result_path"])
+    return len(rows)
+
+def _maybe_prune():
+    global _last_prune
+    now = time.time()
+    with _SUBMIT_LOCK:
+        if now - _last_prune < PRUNE_INTERVAL: return
+        _last_prune = now
+    try:
+        prune()
+    except OSError as e:
+        print(f"Job Prune Error: {e}")
+
+def _dedup_key(kind, params):
+    raw = json.dumps({"kind": kind, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def submit(kind, params):
+    """
+    提交后台任务，返回 job_id
+    相同 kind + params 的任务若仍在排队/运行，直接复用已有任务；
+    REUSE_DONE_KINDS 中的任务在 DEDUP_TTL 内已完成时也直接复用
+    """
+    if kind not in HANDLERS: raise ValueError(f"未知任务类型: {kind}")
+    _maybe_prune()
+    key = _dedup_key(kind, params)
+    now = time.time()
+    # 不复用已完成结果的任务类型：下限取未来时间，只匹配排队/运行中的任务
+    reuse_since = now - DEDUP_TTL if kind in REUSE_DONE_KINDS else now + 1
+
+    with _SUBMIT_LOCK:
+        with _connect() as conn:
+            row = conn.execute(
+                """SELECT id FROM jobs WHERE dedup_key = ? AND
+                   (status IN ('queued', 'running') OR (status = 'done' AND updated_at >= ?))
+                   ORDER BY created_at DESC LIMIT 1""",
+                (key, reuse_since)
+            ).fetchone()
+            if row: return row["id"]
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, dedup_key, status, created_at, updated_at) VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), key, now, now)
+            )
+
+    _EXECUTOR.submit(_execute, job_id)
+    return job_id
+
+def _resume_interrupted():
+    """ 进程重启后，把上次未完成的任务重新排队 """
+    with _connect() as conn:
+        rows = conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        conn.execute("UPDATE jobs SET status = 'queued', message = '进程重启，任务重新排队...' WHERE status = 'running'")
+    for row in rows:
+        _EXECUTOR.submit(_execute, row["id"])
+
+def start():
+    """
+    启动后台任务服务 (每个进程只生效一次)：把上次进程未完成的任务重新排队
+    由 main_app 显式调用；仅导入本模块 (如压测脚本) 不会访问数据库
+    """
+    global _started
+    with _INIT_LOCK:
+        if _started: return
+        _started = True
+    _resume_interrupted()
+
+# =======================================================
+# 4. 页面挂载 (轮询进度)
+# =======================================================
+@st.fragment(run_every=POLL_INTERVAL)
+def _poll(job_id, label):
+    job = get(job_id)
+    if job is None or job["status"] not in ACTIVE_STATES:
+        st.rerun()
+    st.progress(min(job["progress"], 1.0), text=f"{label}：{job['message']}")
+
+def attach(job_id, label):
+    """
+    在页面上挂载任务进度
+    任务仍在运行时渲染进度条并自动轮询 (返回 None)，结束后返回任务记录
+    """
+    job = get(job_id)
+    if job is None: return None
+    if job["status"] in ACTIVE_STATES:
+        _poll(job_id, label)
+        return None
+    return job
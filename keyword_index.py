@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import threading
+
+# =======================================================
+# 🔧 词典配置
+# =======================================================
+# 词典目录：common.json 为通用词典，{app_id}.json 为单游戏词典 (与通用词典合并)
+DICT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionaries")
+COMMON_DICT = "common"
+
+
+class KeywordIndex:
+    """
+    编译后的共享关键词索引
+    相关度关键词 (清洗打分) 与规则引擎分类关键词 (Fallback) 合并为一个正则，
+    一次扫描同时得到两类命中结果
+    """
+
+    def __init__(self, relevance, fallback):
+        # 分类描述: {sentiment: {category: desc}}
+        self.categories = {
+            sentiment: {category: info["desc"] for category, info in cats.items()}
+            for sentiment, cats in fallback.items()
+        }
+
+        # 词条 -> [是否相关度词, {(sentiment, category), ...}]
+        self._targets = {}
+        for kw in relevance:
+            self._targets.setdefault(kw.lower(), [False, set()])[0] = True
+        for sentiment, cats in fallback.items():
+            for category, info in cats.items():
+                for kw in info["kws"]:
+                    self._targets.setdefault(kw.lower(), [False, set()])[1].add((sentiment, category))
+
+        # 长词优先 + 零宽前瞻：同一位置取最长词，不同位置的重叠词也能被计数
+        # 同一位置只会匹配到最长词，因此把作为其前缀的其他词条的命中并入该词
+        # (例如分类词 “打击” 是相关度词 “打击感” 的前缀时，两者都计数)
+        # 词条 -> (相关度词集合, {(sentiment, category), ...})
+        self._credits = {}
+        for term in self._targets:
+            relevance_terms, cats = set(), set()
+            for end in range(1, len(term) + 1):
+                prefix = self._targets.get(term[:end])
+                if prefix is None: continue
+                if prefix[0]: relevance_terms.add(term[:end])
+                cats |= prefix[1]
+            self._credits[term] = (relevance_terms, cats)
+        terms = sorted(self._targets, key=len, reverse=True)
+        self._pattern = re.compile("(?=(" + "|".join(map(re.escape, terms)) + "))", re.IGNORECASE) if terms else None
+
+    def scan(self, text):
+        """
+        单次扫描
+        返回: (命中的相关度关键词数 (去重), {(sentiment, category): 命中次数})
+        """
+        if not self._pattern or not isinstance(text, str): return 0, {}
+        relevance_hits = set()
+        category_hits = {}
+        for m in self._pattern.finditer(text):
+            relevance_terms, cats = self._credits[m.group(1).lower()]
+            relevance_hits.update(relevance_terms)
+            for key in cats:
+                category_hits[key] = category_hits.get(key, 0) + 1
+        return len(relevance_hits), category_hits
+
+    def rank(self, category_hits, sentiment_type):
+        """ 把命中次数汇总为按得分排序的分类列表 (忽略热更新后已不存在的分类) """
+        current = self.categories.get(sentiment_type, {})
+        ranked = [
+            {"category": category, "score": score, "desc": current[category]}
+            for (sentiment, category), score in category_hits.items()
+            if sentiment == sentiment_type and category in current and score > 0
+        ]
+        return sorted(ranked, key=lambda x: x['score'], reverse=True)
+
+
+def hits_to_column(category_hits):
+    """ 分类命中的可存储形式：键为 "sentiment:category" 字符串 (DataFrame 列可被 Arrow 序列化) """
+    return {f"{sentiment}:{category}": n for (sentiment, category), n in category_hits.items()}
+
+def hits_from_column(stored):
+    return {tuple(key.split(":", 1)): n for key, n in stored.items()}
+
+
+# =======================================================
+# 热加载缓存：按文件 mtime 判断是否需要重新编译
+# =======================================================
+_CACHE = {}  # app_id -> (signature, KeywordIndex)
+_LOCK = threading.Lock()
+
+
+def _dict_paths(app_id):
+    paths = [os.path.join(DICT_DIR, f"{COMMON_DICT}.json")]
+    if app_id:
+        game_path = os.path.join(DICT_DIR, f"{app_id}.json")
+        if os.path.exists(game_path): paths.append(game_path)
+    return paths
+
+
+def _signature(paths):
+    sig = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            sig.append((p, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((p, None, None))
+    return tuple(sig)
+
+
+def _load(paths):
+    relevance = []
+    fallback = {}
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            data = json.load(f)
+        relevance.extend(data.get("relevance", []))
+        for sentiment, cats in data.get("fallback", {}).items():
+            fallback.setdefault(sentiment, {}).update(cats)
+    return KeywordIndex(relevance, fallback)
+
+
+def get_index(app_id=None):
+    """
+    获取 app_id 对应的关键词索引 (通用词典 + 游戏词典)
+    词典文件变更后下一次调用自动重新编译，无需重启应用；
+    文件写到一半解析失败时继续使用上一版索引
+    """
+    paths = _dict_paths(app_id)
+    sig = _signature(paths)
+    key = app_id or COMMON_DICT
+
+    with _LOCK:
+        cached = _CACHE.get(key)
+        if cached and cached[0] == sig: return cached[1]
+
+    try:
+        index = _load(paths)
+    except (OSError, ValueError) as e:
+        print(f"Dictionary Load Error: {e}")
+        if cached: return cached[1]
+        index = KeywordIndex([], {})
+
+    with _LOCK:
+        _CACHE[key] = (sig, index)
+    return index
@@ -0,0 +1,187 @@
+import time
+import threading
+import concurrent.futures
+from collections import deque
+
+# =======================================================
+# 🔧 调度参数 (默认值)
+# =======================================================
+DEFAULT_DEADLINE = 45.0          # Map 阶段整体截止时间 (秒)
+DEFAULT_REDUCE_DEADLINE = 30.0   # Reduce 单次调用截止时间 (秒)
+DEFAULT_REQUEST_TIMEOUT = 20.0   # 单次 HTTP 请求超时 (秒)
+DEFAULT_TOKEN_BUDGET = 12000     # 单次分析请求允许消耗的 Token 上限 (输入 + 输出)
+DEFAULT_MAX_OUTPUT_TOKENS = 800  # 单次调用的输出 Token 上限
+
+
+def estimate_tokens(text):
+    """
+    粗略估算 Token 数：中文约 1 字 ≈ 1 Token，其余字符约 4 个 ≈ 1 Token
+    """
+    if not text: return 0
+    cjk = sum(1 for ch in text if '\u4e00' <= ch <= '\u9fff')
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+class LLMScheduler:
+    """
+    成本 + 延迟感知的 LLM 调度器
+    1. 滚动窗口统计 API 延迟与错误率 (熔断判断)
+    2. 每次分析请求的 Token 预算 + 截止时间
+    3. 超时/失败/超预算的切片逐个降级到本地规则引擎，而不是全有或全无
+    """
+
+    def __init__(self, window=50, deadline=DEFAULT_DEADLINE, reduce_deadline=DEFAULT_REDUCE_DEADLINE,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, token_budget=DEFAULT_TOKEN_BUDGET,
+                 max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS, error_threshold=0.5, min_samples=5,
+                 cooldown=60.0, max_workers=6):
+        self.deadline = deadline
+        self.reduce_deadline = reduce_deadline
+        self.request_timeout = request_timeout
+        self.token_budget = token_budget
+        self.max_output_tokens = max_output_tokens
+        self.error_threshold = error_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.max_workers = max_workers
+
+        self._samples = deque(maxlen=window)  # (latency, ok)
+        self._opened_at = None                # 熔断打开时间
+        self._lock = threading.Lock()
+
+    # ---------------------------------------------------
+    # 1. 滚动指标
+    # ---------------------------------------------------
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((latency, ok))
+            if len(self._samples) >= self.min_samples:
+                errors = sum(1 for _, s in self._samples if not s)
+                if errors / len(self._samples) >= self.error_threshold:
+                    self._opened_at = time.monotonic()
+                elif ok:
+                    self._opened_at = None
+
+    def stats(self):
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return {"samples": 0, "error_rate": 0.0, "p50": 0.0, "p95": 0.0}
+        latencies = sorted(lat for lat, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "error_rate": errors / len(samples),
+            "p50": latencies[int(0.50 * (len(latencies) - 1))],
+            "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        }
+
+    def is_healthy(self):
+        """
+        熔断器：错误率过高时在 cooldown 内直接走本地引擎；冷却结束后放行试探 (half-open)
+        """
+        with self._lock:
+            if self._opened_at is None: return True
+            return (time.monotonic() - self._opened_at) >= self.cooldown
+
+    def _timed(self, fn, args, is_success=bool):
+        """ 在 worker 线程内执行并记录真实延迟 (迟到的结果同样计入统计) """
+        start = time.monotonic()
+        try:
+            result = fn(*args)
+        except Exception:
+            self.record(time.monotonic() - start, False)
+            raise
+        self.record(time.monotonic() - start, is_success(result))
+        return result
+
+    # ---------------------------------------------------
+    # 2. 带截止时间的 Map 调度
+    # ---------------------------------------------------
+    def run_map(self, tasks, worker, fallback, on_progress=None, is_success=bool, reserve_tokens=0):
+        """
+        tasks: [(args_tuple, text_for_budget, label), ...]
+        reserve_tokens: 为后续调用 (如 Reduce) 预留的预算，Map 阶段只能使用剩余部分
+        worker(*args) -> is_success(结果) 为真视为成功 (默认非空即成功)
+        fallback(args) -> 本地降级结果
+        返回: [(result, source)]，与 tasks 一一对应，source 为 "llm" / "local"
+        """
+        results = [None] * len(tasks)
+        total = len(tasks)
+        completed = 0
+
+        def _done(idx, value, source):
+            nonlocal completed
+            results[idx] = (value, source)
+            completed += 1
+            if on_progress: on_progress(completed, total, tasks[idx][2], source)
+
+        # 1. Token 预算：超出预算或熔断中的切片直接本地处理
+        spent = reserve_tokens
+        admitted = []
+        for idx, (args, text, _) in enumerate(tasks):
+            cost = estimate_tokens(text) + self.max_output_tokens
+            if self.is_healthy() and spent + cost <= self.token_budget:
+                spent += cost
+                admitted.append(idx)
+            else:
+                _done(idx, fallback(args), "local")
+
+        if not admitted: return results
+
+        # 2. 并发提交，按截止时间收割
+        deadline_at = time.monotonic() + self.deadline
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {executor.submit(self._timed, worker, tasks[idx][0], is_success): idx for idx in admitted}
+        pending = set(futures)
+        try:
+            while pending:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0: break
+                done, pending = concurrent.futures.wait(pending, timeout=remaining,
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in done:
+                    idx = futures[f]
+                    try:
+                        value = f.result()
+                    except Exception:
+                        value = None
+                    if value is not None and is_success(value):
+                        _done(idx, value, "llm")
+                    else:
+                        _done(idx, fallback(tasks[idx][0]), "local")
+
+            # 3. 取消掉队者 (已在运行的请求由 HTTP 超时兜底，并在结束时自行计入统计)
+            for f in pending:
+                f.cancel()
+                idx = futures[f]
+                _done(idx, fallback(tasks[idx][0]), "local")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    # ---------------------------------------------------
+    # 3. 带截止时间的单次调用 (Reduce)
+    # ---------------------------------------------------
+    def call(self, fn, *args, fallback=None, is_success=bool):
+        """
+        在 reduce_deadline 内执行 fn(*args)，失败/超时/熔断或 is_success(结果) 为假时返回 fallback()
+        返回: (result, source)
+        """
+        if not self.is_healthy():
+            return (fallback() if fallback else None), "local"
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self._timed, fn, args, is_success)
+        try:
+            value = future.result(timeout=self.reduce_deadline)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            value = None
+        except Exception:
+            value = None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if value is not None and is_success(value): return value, "llm"
+        return (fallback() if fallback else None), "local"
@@ -0,0 +1,387 @@
+"""
+看板压测脚本：模拟 N 个分析师并发执行 采集 -> 清洗 -> 深度分析 -> RAG 查询
+通过 Streamlit AppTest 无头驱动 main_app.py (每个用户一个独立会话)，
+Steam 评论接口与 DeepSeek 接口由本地替身服务代替，结果可重复、不消耗真实配额
+
+用法:
+    python loadtest.py --users 1,4,8,16 --target 1000
+    python loadtest.py --users 8 --job-workers 8 --llm-latency 1.5 --json report.json
+
+输出: 各并发档位下每个步骤的延迟分位数 (p50/p95/p99/max)、每会话内存、吞吐量 (完整流程/分钟)
+"""
+import os
+import sys
+import json
+import time
+import random
+import pickle
+import argparse
+import resource
+import tempfile
+import threading
+import concurrent.futures
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+# 与 main_app.py 共享进程内模块：替身地址与隔离目录直接写入模块配置
+# (这些模块导入时不访问 data/；jobs 在 main_app 首次运行调用 jobs.start() 时才建库/恢复任务)
+import scraper
+import analyzer
+import jobs
+import archive
+import checkpoint
+import insight_store
+import exporter
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_app.py")
+STEPS = ["render", "collect", "clean", "analyze", "rag"]
+RAG_QUERIES = ["优化", "剧情", "服务器", "画面", "BUG"]
+
+# =======================================================
+# 1. 本地替身服务 (Steam 评论接口 + DeepSeek Chat 接口)
+# =======================================================
+POS_PHRASES = ["画面非常震撼，光影细节拉满", "剧情很有深度，结局让人回味", "打击感扎实，越玩越上头",
+               "BGM 和配音都很出色", "关卡设计有趣，机制丰富", "风景太美了，截图停不下来"]
+NEG_PHRASES = ["优化太差，开场就掉帧卡顿", "频繁闪退，还遇到坏档 BUG", "服务器经常掉线，联机延迟高",
+               "前期节奏太无聊", "报错之后进不去游戏", "卡顿严重，画质调低也没用"]
+
+
+class StandIn:
+    """ 进程内 HTTP 替身：按配置的延迟返回确定性的评论页与 LLM 回复，并统计请求数 """
+
+    def __init__(self, pages=30, steam_latency=0.05, llm_latency=0.5):
+        self.pages = pages
+        self.steam_latency = steam_latency
+        self.llm_latency = llm_latency
+        self.counts = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if not url.path.startswith("/appreviews/"):
+                    self.send_error(404)
+                    return
+                stand_in._count("steam")
+                time.sleep(stand_in.steam_latency)
+                app_id = url.path.rsplit("/", 1)[-1]
+                query = parse_qs(url.query)
+                self._reply(stand_in.review_page(app_id, query.get("language", ["schinese"])[0],
+                                                 query.get("cursor", ["*"])[0]))
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                kind, content = stand_in.chat_reply(request["messages"])
+                stand_in._count(f"llm:{kind}")
+                time.sleep(stand_in.llm_latency)
+                prompt_tokens = sum(len(m["content"]) for m in request["messages"])
+                self._reply({
+                    "id": "chatcmpl-loadtest", "object": "chat.completion", "created": int(time.time()),
+                    "model": request.get("model", "deepseek-chat"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content),
+                              "total_tokens": prompt_tokens + len(content)},
+                })
+
+        return Handler
+
+    def review_page(self, app_id, language, cursor):
+        """ 游标为页码；超过 pages 页后返回空页 (与 Steam 数据抓完时一致) """
+        page = 0 if cursor == "*" else int(cursor)
+        if page >= self.pages:
+            return {"success": 1, "reviews": [], "cursor": cursor}
+        reviews = []
+        for i in range(100):
+            rng = random.Random(f"{app_id}:{language}:{page}:{i}")
+            voted_up = rng.random() < 0.8
+            phrases = rng.sample(POS_PHRASES if voted_up else NEG_PHRASES, rng.randint(1, 3))
+            reviews.append({
+                "recommendationid": f"{app_id}{page:05d}{i:03d}",
+                "review": "，".join(phrases) + "！" * rng.randint(0, 2),
+                "author": {"playtime_forever": rng.choice([30, 90, 600, 3000, 15000])},
+                "voted_up": voted_up,
+                "votes_up": rng.randint(0, 500),
+                "timestamp_created": 1735689600 - page * 3600 - i * 30,
+                "language": language,
+            })
+        return {"success": 1, "reviews": reviews, "cursor": str(page + 1)}
+
+    def chat_reply(self, messages):
+        """ 按提示词区分调用方：Reduce / 退款诊断需要 JSON，Map / RAG 返回文本 """
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        if '"insights"' in system:
+            return "reduce", json.dumps({
+                "insights": [{"category": "画面表现", "desc": "光影与场景获得一致好评", "score": 92},
+                             {"category": "优化问题", "desc": "部分机型掉帧卡顿", "score": 78}],
+                "entities": ["序章"],
+            }, ensure_ascii=False)
+        if "劝退原因" in system:
+            return "refund", json.dumps([{"category": "优化问题", "desc": "开场掉帧", "score": 90}], ensure_ascii=False)
+        if system:
+            return "rag", "1. 现状总结：相关反馈集中。\n2. 具体细节：多条评论提到同一问题。\n3. 改进建议：优先修复。"
+        return "map", "玩家集中提到画面与优化两方面，正负反馈并存。"
+
+# =======================================================
+# 2. 运行环境 (数据目录隔离 + 替身地址)
+# =======================================================
+def isolate(data_dir):
+    """ 把所有持久化路径指向独立目录，避免污染 data/ 且各并发档位互不复用缓存 """
+    os.makedirs(data_dir, exist_ok=True)
+    jobs.DATA_DIR = data_dir
+    jobs.DB_PATH = os.path.join(data_dir, "jobs.sqlite")
+    jobs.RESULT_DIR = os.path.join(data_dir, "jobs")
+    jobs._initialized = False
+    archive.ARCHIVE_DIR = os.path.join(data_dir, "archive")
+    checkpoint.DB_PATH = os.path.join(data_dir, "checkpoints.sqlite")
+    checkpoint._initialized = False
+    insight_store.DB_PATH = os.path.join(data_dir, "insights.sqlite")
+    insight_store._initialized = False
+    exporter.EXPORT_DIR = os.path.join(data_dir, "exports")
+
+def configure(stand_in, job_workers=None):
+    scraper.STEAM_API_BASE = stand_in.url
+    scraper.PAGE_DELAY = 0
+    analyzer.BASE_URL = stand_in.url
+    analyzer.DEEPSEEK_API_KEY = "sk-loadtest"
+    if job_workers and job_workers != jobs.JOB_WORKERS:
+        jobs._EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=job_workers, thread_name_prefix="job")
+    # 保持线上的去重设置：analyzer.run 依赖已完成分析任务的复用来挂载结果；
+    # 采集任务本身不复用已完成结果，清洗/分析任务以各自的上游任务 ID 为参数，不会跨用户复用
+
+# =======================================================
+# 3. 单个用户会话
+# =======================================================
+def _widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+# AppTest 的脚本运行不是线程安全的 (并发 run 会互相覆盖控件注册)，脚本重跑在进程内串行执行；
+# 采集/清洗/分析等后台任务 (延迟的主要来源) 仍在任务线程池中并发运行，与线上一致
+_APP_LOCK = threading.Lock()
+
+def _run(at):
+    with _APP_LOCK:
+        at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+def _wait_job(at, job_key, data_key, timeout):
+    """ 等待后台任务结束后重跑页面，让 _attach_job 把结果载入会话 (等价于前端轮询触发的 rerun) """
+    deadline = time.time() + timeout
+    while True:
+        job = jobs.get(at.session_state[job_key])
+        if job is None: raise RuntimeError(f"{job_key} 未提交")
+        if job["status"] not in jobs.ACTIVE_STATES: break
+        if time.time() > deadline: raise TimeoutError(f"{job_key} 超时 ({job['message']})")
+        time.sleep(jobs.POLL_INTERVAL)
+    _run(at)
+    if at.session_state[data_key] is None:
+        raise RuntimeError(f"{job_key} 失败：{job['error']}")
+
+def session_bytes(at):
+    """ 会话状态占用：DataFrame 按 deep memory_usage 计，其余对象按序列化大小估算 """
+    total = 0
+    for key in list(at.session_state):
+        try:
+            value = at.session_state[key]
+        except (KeyError, AttributeError):
+            continue
+        if isinstance(value, pd.DataFrame):
+            total += int(value.memory_usage(deep=True).sum())
+        else:
+            try:
+                total += len(pickle.dumps(value))
+            except Exception:
+                pass
+    return total
+
+def user_flow(user, args):
+    """ 一个分析师的完整操作路径，返回 {"user", "steps": {step: seconds}, "session_bytes", "error"} """
+    result = {"user": user, "steps": {}, "session_bytes": 0, "error": None}
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    at.secrets["DEEPSEEK_API_KEY"] = analyzer.DEEPSEEK_API_KEY
+
+    def _step(name, fn):
+        start = time.perf_counter()
+        fn()
+        result["steps"][name] = time.perf_counter() - start
+
+    try:
+        _step("render", lambda: _run(at))
+        game_box = _widget(at.selectbox, "游戏名称")
+        game_name = game_box.options[0 if args.shared else user % len(game_box.options)]
+        game_box.select(game_name)
+        _widget(at.number_input, "目标数量").set_value(args.target)
+
+        def _collect():
+            _widget(at.button, "开始采集").click()
+            _run(at)
+            _wait_job(at, "raw_job", "raw_data", args.timeout)
+        _step("collect", _collect)
+
+        def _clean():
+            _widget(at.button, "执行清洗").click()
+            _run(at)
+            _wait_job(at, "clean_job", "clean_data", args.timeout)
+        _step("clean", _clean)
+
+        def _analyzed():
+            return "analysis_cache" in at.session_state and game_name in at.session_state["analysis_cache"]
+
+        def _analyze():
+            # 分析任务运行期间 analyzer.run 提前返回；任务结束后的重跑把结论写入 analysis_cache
+            deadline = time.time() + args.timeout
+            while not _analyzed():
+                if time.time() > deadline: raise TimeoutError("analyze 超时")
+                time.sleep(jobs.POLL_INTERVAL)
+                _run(at)
+            # 替身服务始终健康：任何本地降级都说明 LLM 调用链路有问题，不能计为成功流程
+            meta = at.session_state["analysis_cache"][game_name].get("_meta")
+            if meta is None:
+                raise RuntimeError("深度分析未走 LLM (整体降级为本地规则引擎)")
+            if meta["map_local"] or meta["reduce_local"]:
+                raise RuntimeError(f"深度分析部分降级：map_local={meta['map_local']} reduce_local={meta['reduce_local']}")
+        _step("analyze", _analyze)
+
+        def _rag():
+            at.text_input(key="rag_query_input").input(RAG_QUERIES[user % len(RAG_QUERIES)])
+            _widget(at.button, "开始分析 ➔").click()
+            _run(at)
+            if not any("AI 咨询报告" in m.value for m in at.markdown):
+                raise RuntimeError("RAG 未返回结果")
+        _step("rag", _rag)
+        result["session_bytes"] = session_bytes(at)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+# =======================================================
+# 4. 并发档位 + 报告
+# =======================================================
+def _rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_level(n_users, args, data_dir):
+    isolate(data_dir)
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_users, thread_name_prefix="user") as executor:
+        futures = []
+        for user in range(n_users):
+            futures.append(executor.submit(user_flow, user, args))
+            time.sleep(args.ramp)
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - start
+
+    ok = [r for r in results if r["error"] is None]
+    latency = {}
+    for step in STEPS:
+        values = pd.Series([r["steps"][step] for r in results if step in r["steps"]], dtype=float)
+        if values.empty: continue
+        q = values.quantile([0.5, 0.95, 0.99])
+        latency[step] = {"p50": q[0.5], "p95": q[0.95], "p99": q[0.99], "max": values.max()}
+    return {
+        "users": n_users,
+        "completed": len(ok),
+        "errors": [r["error"] for r in results if r["error"]],
+        "wall_seconds": wall,
+        "flows_per_min": len(ok) / wall * 60 if wall else 0.0,
+        "latency": latency,
+        "session_mb": (sum(r["session_bytes"] for r in ok) / len(ok) / 2 ** 20) if ok else 0.0,
+        "peak_rss_mb": _rss_mb(),
+        "rss_growth_mb": _rss_mb() - rss_before,
+    }
+
+def print_level(report, stand_in_counts):
+    print(f"\n=== {report['users']} 个并发用户：完成 {report['completed']}/{report['users']}，"
+          f"耗时 {report['wall_seconds']:.1f}s，吞吐 {report['flows_per_min']:.1f} 流程/分钟 ===")
+    if report["latency"]:
+        table = pd.DataFrame(report["latency"]).T[["p50", "p95", "p99", "max"]]
+        print(table.round(2).to_string())
+    print(f"每会话状态: {report['session_mb']:.2f} MB | 进程峰值 RSS: {report['peak_rss_mb']:.0f} MB "
+          f"(本档位增长 {report['rss_growth_mb']:.0f} MB)")
+    print(f"替身请求数: {json.dumps(stand_in_counts, ensure_ascii=False)} | LLM 调度器: {analyzer.LLM_SCHEDULER.stats()}")
+    for error in report["errors"][:5]:
+        print(f"  ⚠️ {error}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并发用户压测 (AppTest + 本地 Steam/LLM 替身)")
+    parser.add_argument("--users", default="1,4,8", help="并发档位，逗号分隔 (默认 1,4,8)")
+    parser.add_argument("--target", type=int, default=1000, help="每个用户的采集目标数量")
+    parser.add_argument("--shared", action="store_true", help="所有用户分析同一款游戏 (验证任务去重)")
+    parser.add_argument("--ramp", type=float, default=0.2, help="用户启动间隔 (秒)")
+    parser.add_argument("--timeout", type=float, default=300, help="单步超时 (秒)")
+    parser.add_argument("--job-workers", type=int, default=None, help="覆盖后台 Worker 数量 (默认沿用 jobs.JOB_WORKERS)")
+    parser.add_argument("--steam-pages", type=int, default=30, help="替身每种语言可翻的页数 (每页 100 条)")
+    parser.add_argument("--steam-latency", type=float, default=0.05, help="替身 Steam 每页延迟 (秒)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="替身 LLM 每次调用延迟 (秒)")
+    parser.add_argument("--data-dir", default=None, help="压测数据目录 (默认临时目录)")
+    parser.add_argument("--json", default=None, help="把报告另存为 JSON 文件")
+    args = parser.parse_args(argv)
+
+    stand_in = StandIn(args.steam_pages, args.steam_latency, args.llm_latency).start()
+    configure(stand_in, args.job_workers)
+    root = args.data_dir or tempfile.mkdtemp(prefix="steam-loadtest-")
+    print(f"替身服务: {stand_in.url} | 数据目录: {root}")
+
+    reports = []
+    try:
+        for n_users in [int(n) for n in args.users.split(",") if n.strip()]:
+            stand_in.counts = {}
+            report = run_level(n_users, args, os.path.join(root, f"users-{n_users}"))
+            report["stand_in_requests"] = dict(stand_in.counts)
+            if report["completed"] and not stand_in.counts.get("llm:map"):
+                report["errors"].append("替身未收到任何 Map 请求 (Map 阶段全部本地降级)")
+            print_level(report, report["stand_in_requests"])
+            reports.append(report)
+    finally:
+        stand_in.stop()
+
+    # 吞吐上限：并发翻倍后吞吐提升不足 10% 视为饱和
+    for prev, cur in zip(reports, reports[1:]):
+        if prev["flows_per_min"] and cur["flows_per_min"] < prev["flows_per_min"] * 1.1:
+            print(f"\n📉 吞吐在 {prev['users']} -> {cur['users']} 用户之间饱和 "
+                  f"(约 {max(prev['flows_per_min'], cur['flows_per_min']):.1f} 流程/分钟)")
+            break
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+    return 0 if all(not r["errors"] for r in reports) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,14 @@ import streamlit as st
 import scraper
 import cleaner
 import analyzer
+import jobs
+import archive
+import exporter
 
 # --- 页面基础配置 ---
 st.set_page_config(page_title="Steam2025年度游戏热销榜舆情洞察平台", layout="wide", page_icon="🎮")
+# 后台任务服务：进程内首次运行时恢复被中断的任务
+jobs.start()
 
 # --- 🍎 Apple 风格核心 CSS 注入 ---
 st.markdown("""
@@ -65,6 +70,21 @@ st.markdown("""
 # ==========================================
 if 'raw_data' not in st.session_state: st.session_state.raw_data = None
 if 'clean_data' not in st.session_state: st.session_state.clean_data = None
+# 后台任务 ID 同步到 URL，刷新页面后可重新挂载到同一任务
+if 'raw_job' not in st.session_state: st.session_state.raw_job = st.query_params.get("scrape")
+if 'clean_job' not in st.session_state: st.session_state.clean_job = st.query_params.get("clean")
+
+def _attach_job(job_key, data_key, label):
+    """ 挂载后台任务：完成后把结果载入 session_state，失败时给出提示 """
+    job_id = st.session_state[job_key]
+    if not job_id or st.session_state[data_key] is not None: return
+    job = jobs.attach(job_id, label)
+    if job is None: return
+    if job["status"] == "done":
+        st.session_state[data_key] = jobs.load_result(job)
+    else:
+        st.warning(f"⚠️ {label}失败：{job['error']}")
+        st.session_state[job_key] = None
 
 GAME_DB = {
     "1. 黑神话：悟空 (Black Myth: Wukong)": "2358720",
@@ -83,6 +103,17 @@ GAME_DB = {
     "14. 空洞骑士：丝之歌 (Silksong)": "1030300", 
     "15. GTA V (Grand Theft Auto V)": "271590"
 }
+APP_NAMES = {app_id: name for name, app_id in GAME_DB.items()}
+
+def _job_app_id(job_id):
+    """ 任务所属的 app_id：数据归属以任务参数为准，而不是当前的控件值 """
+    job = jobs.get(job_id)
+    return job["params"]["app_id"] if job else None
+
+# 通过 URL 重新挂载任务时，同步恢复对应的游戏选择
+if 'game_select' not in st.session_state:
+    restored_game = APP_NAMES.get(_job_app_id(st.session_state.raw_job))
+    if restored_game: st.session_state.game_select = restored_game
 
 # 1. 采集模块
 with st.container():
@@ -90,17 +121,43 @@ with st.container():
         col_a, col_b = st.columns([1, 2], gap="large")
         with col_a:
             st.markdown("##### 选择目标")
-            selected_game_name = st.selectbox("游戏名称", list(GAME_DB.keys()), label_visibility="collapsed")
+            selected_game_name = st.selectbox("游戏名称", list(GAME_DB.keys()), label_visibility="collapsed", key="game_select")
             target_app_id = GAME_DB[selected_game_name]
+            st.markdown("##### 评论语言")
+            selected_languages = st.multiselect("评论语言", list(scraper.SUPPORTED_LANGUAGES.keys()), default=["schinese"],
+                                                format_func=lambda lang: scraper.SUPPORTED_LANGUAGES[lang], label_visibility="collapsed")
         with col_b:
             st.markdown("##### 采集规模")
             c1, c2 = st.columns([3, 1])
             with c1:
-                target_num = st.number_input("目标数量", 100, 5000, 1000, step=100, label_visibility="collapsed")
+                target_num = st.number_input("目标数量", 100, 50000, 1000, step=100, label_visibility="collapsed")
                 st.markdown("""<div style="font-size:12px; color:#86868B; margin-top:5px;">🚀 <b>500-1000</b> (速度优先) &nbsp;|&nbsp; 🛡️ <b>2000+</b> (质量优先)</div>""", unsafe_allow_html=True)
+                # 自适应采样：指标足够精确时提前停止，目标数量变为上限
+                adaptive = st.toggle("📐 自适应采样 (按置信区间自动停止)", value=False)
+                ci_width = None
+                if adaptive:
+                    ci_width = st.select_slider("置信区间宽度", options=[0.04, 0.06, 0.08, 0.10], value=0.06,
+                                                format_func=lambda w: f"±{w / 2:.0%}")
             with c2:
+                new_raw_job = None
                 if st.button("开始采集", type="primary", use_container_width=True):
-                    st.session_state.raw_data = scraper.run(app_id=target_app_id, target_count=target_num)
+                    new_raw_job = jobs.submit("scrape", {"app_id": target_app_id, "target_count": int(target_num), "ci_width": ci_width,
+                                                          "languages": selected_languages or ["schinese"]})
+                # 已有原始页面归档时，可直接本地重建 (无需重新请求 Steam)
+                if archive.list_segments(target_app_id) and st.button("从归档重建", use_container_width=True):
+                    new_raw_job = jobs.submit("replay", {"app_id": target_app_id})
+                if new_raw_job:
+                    st.session_state.raw_job = new_raw_job
+                    st.query_params["scrape"] = st.session_state.raw_job
+                    st.session_state.raw_data = None
+                    st.session_state.clean_job = None
+                    st.session_state.clean_data = None
+                    st.query_params.pop("clean", None)
+        _attach_job("raw_job", "raw_data", "🕷️ 评论采集")
+
+# 已载入数据所属的游戏 (切换下拉框不会改变已采集数据的归属)
+data_app_id = _job_app_id(st.session_state.raw_job) or target_app_id
+data_game_name = APP_NAMES.get(data_app_id, selected_game_name)
 
 # 2. 清洗模块
 if st.session_state.raw_data is not None:
@@ -117,16 +174,20 @@ if st.session_state.raw_data is not None:
             st.write("")
             st.write("")
             if st.button("执行清洗", type="primary", use_container_width=True):
-                st.session_state.clean_data = cleaner.process_data(st.session_state.raw_data, min_pos, min_neg, selected_game_name)
+                st.session_state.clean_job = jobs.submit("clean", {"source_job": st.session_state.raw_job, "min_pos": min_pos, "min_neg": min_neg, "app_id": data_app_id})
+                st.query_params["clean"] = st.session_state.clean_job
+                st.session_state.clean_data = None
                 st.session_state.review_idx = 0
+        _attach_job("clean_job", "clean_data", "🧼 数据清洗")
         if st.session_state.clean_data is not None:
             cleaner.show_ui(st.session_state.raw_data, st.session_state.clean_data)
 
 # 3. 分析模块
 if st.session_state.clean_data is not None:
     st.markdown("---")
-    analyzer.run(st.session_state.clean_data, game_name=selected_game_name)
+    analyzer.run(st.session_state.clean_data, game_name=data_game_name, app_id=data_app_id, source_job=st.session_state.clean_job)
     st.write("")
-    c_dl, _ = st.columns([1, 4])
+    c_dl, _ = st.columns([2, 3])
     with c_dl:
-        st.download_button(f"📥 导出报告 (.csv)", data=st.session_state.clean_data.to_csv(index=False).encode('utf-8-sig'), file_name='analysis_report.csv', type="primary")
\ No newline at end of file
+        insights = st.session_state.get('analysis_cache', {}).get(data_game_name)
+        exporter.show_ui(st.session_state.clean_data, insights)
\ No newline at end of file
@@ -0,0 +1,97 @@
+import math
+import pandas as pd
+import keyword_index
+
+# =======================================================
+# 🔧 采样配置
+# =======================================================
+Z_95 = 1.96
+PLAYTIME_BINS = [-0.1, 2, 10, 50, 200, float("inf")]
+PLAYTIME_LABELS = ["≤2h", "2-10h", "10-50h", "50-200h", "200h+"]
+MIN_SAMPLES = 200          # 自适应停止前的最少样本数
+MIN_PER_STRATUM = 20       # 每个主要分层 (占比 ≥ MIN_STRATUM_SHARE) 的最少样本数
+MIN_STRATUM_SHARE = 0.05
+
+
+def wilson_interval(successes, n, z=Z_95):
+    """ Wilson 置信区间，返回 (low, high)；小样本与极端比例下比正态近似稳定 """
+    if n == 0: return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+def wilson_width(successes, n, z=Z_95):
+    low, high = wilson_interval(successes, n, z)
+    return high - low
+
+def playtime_bucket(hours):
+    for upper, label in zip(PLAYTIME_BINS[1:], PLAYTIME_LABELS):
+        if hours <= upper: return label
+    return PLAYTIME_LABELS[-1]
+
+
+class ConvergenceTracker:
+    """
+    自适应采集的停止判据：增量维护好评率、2 小时劝退率与各分类提及率，
+    当所有估计的置信区间宽度都不超过 ci_width，且主要分层 (时长段 × 好/差评) 样本充足时停止
+    """
+
+    def __init__(self, ci_width, app_id=None, z=Z_95):
+        self.ci_width = ci_width
+        self.z = z
+        self.index = keyword_index.get_index(app_id)
+        self.n = 0
+        self.positive = 0
+        self.churn = 0
+        self.category_counts = {}
+        self.strata = {}
+
+    def update(self, records):
+        for r in records:
+            self.n += 1
+            voted_up = bool(r["voted_up"])
+            hours = r["playtime_hours"]
+            self.positive += voted_up
+            self.churn += (hours <= 2 and not voted_up)
+            stratum = (playtime_bucket(hours), voted_up)
+            self.strata[stratum] = self.strata.get(stratum, 0) + 1
+            # 分类提及率：每条评论对每个分类最多计 1 次
+            _, hits = self.index.scan(r.get("content"))
+            for key in hits:
+                self.category_counts[key] = self.category_counts.get(key, 0) + 1
+
+    def widths(self):
+        widths = {
+            "positive_rate": wilson_width(self.positive, self.n, self.z),
+            "churn_rate": wilson_width(self.churn, self.n, self.z),
+        }
+        for (sentiment, category), count in self.category_counts.items():
+            widths[f"{sentiment}:{category}"] = wilson_width(count, self.n, self.z)
+        return widths
+
+    def strata_ready(self):
+        return all(count >= MIN_PER_STRATUM for count in self.strata.values()
+                   if count / self.n >= MIN_STRATUM_SHARE)
+
+    def converged(self):
+        if self.n < MIN_SAMPLES: return False
+        return self.strata_ready() and max(self.widths().values()) <= self.ci_width
+
+
+def stratified_sample(df, n, id_col="review_id"):
+    """
+    按 (游玩时长段 × voted_up) 分层的比例抽样，每个非空分层至少保留 min(MIN_PER_STRATUM, 分层大小) 条
+    抽样顺序由评论 ID (缺失时用正文) 的哈希决定：结果稳定可复现，新增评论不会打乱已选中的样本
+    """
+    if n >= len(df) or df.empty: return df
+    key = df[id_col] if id_col in df else df["content"]
+    order = pd.util.hash_pandas_object(key.astype(str), index=False)
+    strata = [pd.cut(df["playtime_hours"], PLAYTIME_BINS, labels=PLAYTIME_LABELS), df["voted_up"]]
+
+    picked = []
+    for _, group in df.assign(_order=order.values).groupby(strata, observed=True):
+        quota = max(round(n * len(group) / len(df)), min(MIN_PER_STRATUM, len(group)))
+        picked.append(group.nsmallest(quota, "_order"))
+    return pd.concat(picked).drop(columns="_order").sort_index()
@@ -1,39 +1,94 @@
 import requests
 import pandas as pd
 import time
-import streamlit as st
+import math
+import threading
+import concurrent.futures
+import archive
+import sampling
+import checkpoint
 
-def run(app_id='2358720', target_count=2000):
+NETWORK_WARNING = "⚠️ 网络连接不稳定，正在自动重试..."
+MAX_PAGES_FLOOR = 100  # 安全熔断的最低页数；大目标按目标数量放宽
+STEAM_API_BASE = "https://store.steampowered.com"  # 压测时指向本地替身服务 (见 loadtest.py)
+PAGE_DELAY = 0.5       # 翻页间隔 (秒)，防封禁
+
+# 分析流程使用的字段投影 (Steam 原始 JSON -> DataFrame 列)
+# 原始页面完整归档在 data/archive/，新增字段只需修改投影后调用 archive.replay 重建
+REVIEW_FIELDS = {
+    "review_id": "recommendationid",
+    "content": "review",
+    "playtime_hours": lambda r: round(r['author']['playtime_forever'] / 60, 1),
+    "voted_up": "voted_up",
+    "votes_up": "votes_up",
+    "create_time": "timestamp_created",
+    "language": "language",
+}
+
+# Steam API 语言代码 -> 展示名
+SUPPORTED_LANGUAGES = {
+    "schinese": "简体中文",
+    "tchinese": "繁體中文",
+    "english": "English",
+    "japanese": "日本語",
+    "koreana": "한국어",
+    "russian": "Русский",
+    "spanish": "Español",
+    "german": "Deutsch",
+    "french": "Français",
+    "brazilian": "Português-Brasil",
+}
+
+def _to_records(batch_reviews, language):
+    batch_records = [archive.project(r, REVIEW_FIELDS) for r in batch_reviews]
+    for record in batch_records: record["language"] = record["language"] or language
+    return batch_records
+
+def _collect_language(app_id, language, target_count, report, keep_archive, ci_width, checkpoint_key=None):
     """
-    执行采集任务的主函数 (V2.0: 优化网络异常提示)
+    单语言翻页采集；report(delta_count, message) 上报本页新增条数
+    checkpoint_key: 提供时每 CHECKPOINT_EVERY 页保存断点，重启后从断点继续 (依赖原始页面归档)
     """
-    st.info(f"🕷️ 爬虫启动！目标：采集 {target_count} 条有效评论...")
-    
     reviews_data = []
     cursor = '*'  # Steam 翻页游标
-    
-    # 进度条初始化
-    progress_bar = st.progress(0)
-    status_text = st.empty() # 这是一个占位符，我们会不断更新它
+    fetched = set()  # 已完成页面的请求游标：同一页不会被请求两次
+    writer = archive.ArchiveWriter(app_id, language) if keep_archive else None
+    tracker = sampling.ConvergenceTracker(ci_width, app_id) if ci_width else None
+    tag = SUPPORTED_LANGUAGES.get(language, language)
+    resumable = bool(checkpoint_key and writer)
+    segments = []
     
     page = 0
+    # 0. 断点恢复：回放本次采集已写入的归档分段 (包括最后一次断点之后已落盘的页面)
+    ckpt = checkpoint.load(checkpoint_key, language) if resumable else None
+    if ckpt:
+        segments = list(ckpt["segments"])
+        for path in segments:
+            for rec in archive.read_segment(path):
+                batch_records = _to_records(rec["reviews"], language)
+                reviews_data.extend(batch_records)
+                if tracker: tracker.update(batch_records)
+                fetched.add(rec["cursor"])
+                cursor = rec.get("next_cursor") or cursor
+                page += 1
+        report(len(reviews_data), f"♻️ [{tag}] 从断点恢复：已有 {page} 页 / {len(reviews_data)} 条")
+    if writer: segments.append(writer.path)
+    max_pages = max(MAX_PAGES_FLOOR, math.ceil(target_count / 100) * 2)
+    
     # 循环抓取，直到达到目标数量
     while len(reviews_data) < target_count:
+        # Steam 游标回到已抓取过的位置，说明已无新数据
+        if cursor in fetched:
+            report(0, f"⚠️ [{tag}] Steam 数据已全部抓取完毕，提前结束。")
+            break
         page += 1
+        report(0, f"[{tag}] 正在采集第 {page} 页... (已获取: {len(reviews_data)}/{target_count})")
         
-        # 1. 更新 UI 状态 (正常状态)
-        current_count = len(reviews_data)
-        progress = min(current_count / target_count, 1.0)
-        progress_bar.progress(progress)
-        
-        # 正常显示的文字
-        status_text.markdown(f"**🔄 正在采集第 {page} 页...** (已获取: {current_count}/{target_count})")
-        
-        # 2. 构造 API 请求
-        url = f"https://store.steampowered.com/appreviews/{app_id}?json=1"
+        # 构造 API 请求
+        url = f"{STEAM_API_BASE}/appreviews/{app_id}?json=1"
         params = {
             'filter': 'recent',
-            'language': 'schinese',
+            'language': language,
             'num_per_page': 100,
             'review_type': 'all',
             'purchase_type': 'all',
@@ -51,61 +106,82 @@ def run(app_id='2358720', target_count=2000):
                 batch_reviews = data.get('reviews', [])
                 
                 if not batch_reviews:
-                    st.warning("⚠️ Steam 数据已全部抓取完毕，提前结束。")
+                    report(0, f"⚠️ [{tag}] Steam 数据已全部抓取完毕，提前结束。")
                     break
                 
-                # 3. 提取数据
-                for r in batch_reviews:
-                    reviews_data.append({
-                        "content": r['review'],
-                        "playtime_hours": round(r['author']['playtime_forever'] / 60, 1),
-                        "voted_up": r['voted_up'],
-                        "votes_up": r['votes_up'],
-                        "create_time": r['timestamp_created']
-                    })
+                # 归档原始页面 + 按投影提取数据
+                next_cursor = data.get('cursor', cursor)
+                if writer: writer.append(cursor, batch_reviews, next_cursor)
+                batch_records = _to_records(batch_reviews, language)
+                reviews_data.extend(batch_records)
+                report(len(batch_records), f"[{tag}] 第 {page} 页完成")
+                
+                # 更新游标
+                fetched.add(cursor)
+                cursor = next_cursor
                 
-                # 4. 更新游标
-                cursor = data.get('cursor', cursor)
+                # 保存断点 (本次会话首页 + 每 N 页)
+                if resumable and (writer.pages == 1 or page % checkpoint.CHECKPOINT_EVERY == 0):
+                    writer.sync()
+                    checkpoint.save(checkpoint_key, language, segments, page, cursor)
                 
-                # 5. 防封禁休眠
-                time.sleep(0.5)
+                # 自适应采样：估计值已足够精确时停止翻页
+                if tracker:
+                    tracker.update(batch_records)
+                    if tracker.converged():
+                        report(0, f"📐 [{tag}] 指标置信区间已收敛 (±{ci_width / 2:.1%})，提前结束。")
+                        break
+                
+                # 防封禁休眠
+                time.sleep(PAGE_DELAY)
                 
             else:
                 # 这种通常是 Steam 内部错误，静默重试即可
                 time.sleep(1)
                 continue
                 
-        except Exception as e:
-            # ================== 修改重点在这里 ==================
-            # 1. 删掉了 st.error(e) 这个大红框
-            
-            # 2. 在进度文字区域显示温和的橙色提示
-            status_text.markdown(
-                """
-                <div style="color: #ff9f0a; font-weight: bold; padding: 10px; border: 1px dashed #ff9f0a; border-radius: 5px;">
-                    ⚠️ 网络连接不稳定，请稍等...<br>
-                    <span style="font-size:12px; font-weight:normal">若长时间没有进展请刷新网页。</span>
-                </div>
-                """, 
-                unsafe_allow_html=True
-            )
-            
-            # 3. 右下角弹出一个不打扰的小气泡
-            st.toast('网络波动，正在自动重试...', icon='⏳')
-            
-            # 4. 多休息一会儿，给网络一点恢复时间
+        except Exception:
+            # 网络波动：上报温和提示，多休息一会儿后继续，不中断程序
+            report(0, NETWORK_WARNING)
             time.sleep(3) 
-            
-            # 5. 继续循环，不中断程序
             continue 
-            # ===================================================
             
         # 安全熔断：防止无限循环
-        if page > 100:
+        if page >= max_pages:
             break
 
-    # 采集结束
-    progress_bar.progress(1.0)
-    status_text.success(f"✅ 采集完成！共获取 {len(reviews_data)} 条数据")
+    if resumable: checkpoint.finish(checkpoint_key, language)
+    return reviews_data[:target_count]
+
+def collect(app_id='2358720', target_count=2000, on_progress=None, keep_archive=True, ci_width=None, languages=('schinese',),
+            checkpoint_key=None):
+    """
+    采集核心逻辑 (不依赖 Streamlit，可在后台任务线程中运行)
+    on_progress(current_count, page, message): 每页回调一次，用于上报进度
+    keep_archive: 是否把每页原始 JSON 追加写入压缩归档
+    ci_width: 自适应采样模式；好评率/劝退率/分类提及率的 95% 置信区间宽度都不超过该值时提前停止，
+              此时 target_count 仅作为上限 (按语言分别判断)
+    languages: 采集的语言列表，各语言并发翻页，目标数量平均分配；结果带 language 列合并为一张表
+    checkpoint_key: 断点标识 (后台任务使用任务去重 key)；相同 key 的未完成采集会从断点继续
+    """
+    languages = list(languages) or ['schinese']
+    per_language = math.ceil(target_count / len(languages))
+    lock = threading.Lock()
+    state = {"count": 0, "pages": 0}
+    
+    def _report(delta, message):
+        with lock:
+            state["count"] += delta
+            if delta: state["pages"] += 1
+            if on_progress: on_progress(min(state["count"], target_count), state["pages"], message)
     
-    return pd.DataFrame(reviews_data)
\ No newline at end of file
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(languages)) as executor:
+        futures = [executor.submit(_collect_language, app_id, lang, per_language, _report, keep_archive, ci_width, checkpoint_key)
+                   for lang in languages]
+        reviews_data = [record for f in futures for record in f.result()]
+
+    return pd.DataFrame(reviews_data, columns=list(REVIEW_FIELDS))
+
+def replay(app_id='2358720', fields=None):
+    """ 从本地归档重建评论 DataFrame (默认使用 REVIEW_FIELDS 投影)，无需重新采集 """
+    return archive.replay(app_id, fields or REVIEW_FIELDS)
@@ -0,0 +1,173 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# =======================================================
+# 🔧 主题发现配置
+# =======================================================
+N_TOPICS = 8
+MIN_REVIEWS_PER_TOPIC = 15   # 样本太少时自动减少主题数
+BATCH_SIZE = 512
+N_REPRESENTATIVES = 3
+N_KEYWORDS = 5
+N_CANDIDATES = 30            # 每个主题参与短语拼接的候选 n-gram 数
+MAX_CORPUS_REVIEWS = 2000    # 校验拼接短语时每个主题最多使用的评论数
+
+
+def _preprocess(text):
+    # 标点/数字统一替换为空格，避免出现 “，的” 这类无意义 n-gram
+    return re.sub(r'[\W\d_]+', ' ', str(text).lower())
+
+
+class TopicModel:
+    """
+    字符 n-gram TF-IDF + MiniBatchKMeans 聚类
+    首次 fit 建立词表与 IDF；之后新评论通过 partial_fit 按批次更新聚类中心，无需全量重训
+    """
+
+    def __init__(self, n_topics=N_TOPICS, ngram_range=(2, 3), max_features=20000):
+        self.n_topics = n_topics
+        self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=ngram_range, max_features=max_features,
+                                          min_df=2, max_df=0.5, sublinear_tf=True, preprocessor=_preprocess)
+        self.kmeans = MiniBatchKMeans(n_clusters=n_topics, batch_size=BATCH_SIZE, random_state=0, n_init=3)
+        self.seen = set()
+
+    def fit(self, texts, keys):
+        X = self.vectorizer.fit_transform(texts)
+        self.kmeans.fit(X)
+        self.seen.update(keys)
+        return self
+
+    def partial_fit(self, texts, keys):
+        """ 只用未见过的评论更新聚类中心 (词表保持不变) """
+        new = [(t, k) for t, k in zip(texts, keys) if k not in self.seen]
+        for start in range(0, len(new), BATCH_SIZE):
+            batch = new[start:start + BATCH_SIZE]
+            self.kmeans.partial_fit(self.vectorizer.transform([t for t, _ in batch]))
+            self.seen.update(k for _, k in batch)
+        return self
+
+    def top_terms(self, centers, n=N_CANDIDATES):
+        """ 每个聚类中心权重最高的 n 个 n-gram (候选词，交给 _merge_terms 拼接成短语) """
+        names = self.vectorizer.get_feature_names_out()
+        terms = []
+        for center in centers:
+            picked = []
+            for idx in np.argsort(center)[::-1]:
+                term = names[idx].strip()
+                if len(term) < 2 or term in picked: continue
+                picked.append(term)
+                if len(picked) >= n: break
+            terms.append(picked)
+        return terms
+
+
+def _join_overlap(a, b, corpus):
+    """ a 的后缀与 b 的前缀重叠时拼接 (如 “玩越上” + “越上头” -> “玩越上头”)，拼接结果须在评论中真实出现 """
+    for k in range(min(len(a), len(b)) - 1, 0, -1):
+        if a[-k:] == b[:k] and a + b[k:] in corpus: return a + b[k:]
+    return None
+
+def _merge_terms(candidates, corpus, n=N_KEYWORDS):
+    """
+    把重叠的字符 n-gram 合并为完整短语，避免 “越上头 / 玩越上 / 感扎” 这类碎片标签
+    按权重顺序处理候选：被已有短语包含的跳过，能与已有短语拼接的合并，其余作为新短语
+    """
+    phrases = []
+    for term in candidates:
+        if any(term in p for p in phrases): continue
+        for i, p in enumerate(phrases):
+            merged = _join_overlap(p, term, corpus) or _join_overlap(term, p, corpus) or (term if p in term else None)
+            if merged:
+                phrases[i] = merged
+                break
+        else:
+            phrases.append(term)
+        # 合并后的短语可能包含或衔接其他短语：重复合并直到稳定
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(phrases)):
+                for j in range(len(phrases)):
+                    if i == j: continue
+                    a, b = phrases[i], phrases[j]
+                    merged = a if b in a else _join_overlap(a, b, corpus)
+                    if merged:
+                        phrases[i] = merged
+                        del phrases[j]
+                        changed = True
+                        break
+                if changed: break
+    return phrases[:n]
+
+
+# 进程内模型注册表：同一 scope (app_id) 的新数据做增量更新
+# 锁按 scope 划分：不同游戏的聚类可并行；锁内只做 fit/partial_fit 并取聚类中心快照
+_MODELS = {}
+_SCOPE_LOCKS = {}
+_LOCK = threading.Lock()
+
+def _scope_lock(scope):
+    with _LOCK:
+        return _SCOPE_LOCKS.setdefault(scope, threading.Lock())
+
+def discover_topics(df, scope, keys=None):
+    """
+    对 clean_content 做主题发现
+    返回: [{"label", "keywords", "size", "pos_share", "neg_share", "representatives"}, ...] 按规模降序
+    """
+    if df.empty: return []
+    texts = df['clean_content'].astype(str).tolist()
+    keys = list(keys) if keys is not None else texts
+    n_topics = min(N_TOPICS, len(texts) // MIN_REVIEWS_PER_TOPIC)
+    if n_topics < 2: return []
+
+    with _scope_lock(scope):
+        model = _MODELS.get(scope)
+        try:
+            if model is None or model.n_topics != n_topics:
+                model = TopicModel(n_topics).fit(texts, keys)
+                _MODELS[scope] = model
+            else:
+                model.partial_fit(texts, keys)
+        except ValueError:
+            # 有效 n-gram 过少 (例如评论几乎都是表情/符号)
+            return []
+        centers = model.kmeans.cluster_centers_.copy()
+        terms = model.top_terms(centers)
+
+    # 词表在 fit 后不再变化，向量化与最近中心分配无需持锁
+    X = model.vectorizer.transform(texts)
+    distances = euclidean_distances(X, centers)
+    labels = distances.argmin(axis=1)
+
+    voted_up = df['voted_up'].to_numpy()
+    topics = []
+    for k in range(n_topics):
+        members = np.where(labels == k)[0]
+        if len(members) == 0: continue
+        closest = members[np.argsort(distances[members, k])[:N_REPRESENTATIVES]]
+        pos_share = float(voted_up[members].mean())
+        corpus = "\n".join(_preprocess(texts[i]) for i in members[:MAX_CORPUS_REVIEWS])
+        keywords = _merge_terms(terms[k], corpus)
+        topics.append({
+            "label": " / ".join(keywords[:3]),
+            "keywords": keywords,
+            "size": int(len(members)),
+            "pos_share": pos_share,
+            "neg_share": 1 - pos_share,
+            "representatives": [texts[i] for i in closest],
+        })
+    return sorted(topics, key=lambda t: t["size"], reverse=True)
+
+def cluster_digest(topics, max_chars=80):
+    """ 供 LLM 使用的紧凑主题摘要：每个主题一行 (关键词、规模、好差评占比、代表评论节选) """
+    lines = []
+    for i, t in enumerate(topics, 1):
+        sample = t["representatives"][0][:max_chars] if t["representatives"] else ""
+        lines.append(f"主题{i}「{t['label']}」{t['size']} 条，好评 {t['pos_share']:.0%} / 差评 {t['neg_share']:.0%}；例：{sample}")
+    return "\n".join(lines)